@@ -0,0 +1,64 @@
+from argparse import Namespace
+from array import array
+from typing import List, Optional
+import math
+import os
+
+from csv_read_write import stream_file
+from csv_columnar import split_columns, \
+    save_cache, \
+    get_cache_settings
+from csv_compression import STDIN_NAME, \
+    get_input_files
+from csv_sort import ColumnType, \
+    RowSorter
+from csv_time import MAX_TIME_KEY
+from csv_utility import check_quoted_delimiter
+
+
+def get_number_keys(values: List[str], sorter: RowSorter) -> Optional[array]:
+    '''Returns number keys of the given values in the same way as sorter converts them
+    or None if none of the values is a number, so the keys are not worth saving.'''
+    keys = array('d', (sorter.convert_value(value.strip(), ColumnType.NUMBER) for value in values))
+    return keys if any(key != math.inf for key in keys) else None
+
+
+def get_time_keys(values: List[str], sorter: RowSorter) -> Optional[array]:
+    '''Returns time keys of the given values in the same way as sorter converts them
+    or None if none of the values is a time value, so the keys are not worth saving.'''
+    keys = array('q', (sorter.convert_value(value.strip(), ColumnType.TIME) for value in values))
+    return keys if any(key != MAX_TIME_KEY for key in keys) else None
+
+
+def cache_table(filename: str, has_header: bool, delimiter: str,
+                encoding: Optional[str], quoted: bool, time_fmt: str) -> None:
+    '''Reads the given table and saves it into the columnar cache file.
+    ValueError is raised if the table rows cannot be restored from the columns exactly:
+    rows have different number of columns or contain unnecessary quotes.
+    '''
+    stat = os.stat(filename)
+    table = split_columns(stream_file(filename, has_header, encoding), delimiter, quoted)
+    if table is None:
+        raise ValueError(f"Rows of {filename} have different number of columns")
+    rows = stream_file(filename, has_header, encoding).content
+    if any(row != restored for row, restored in zip(rows, table.rows())):
+        raise ValueError(f"Rows of {filename} cannot be restored from the cache exactly")
+    sorter = RowSorter([], [], delimiter, time_fmt)
+    number_keys = [get_number_keys(table.distinct_values(index), sorter)
+                   for index in range(table.column_count)]
+    time_keys = [get_time_keys(table.distinct_values(index), sorter)
+                 for index in range(table.column_count)]
+    save_cache(filename, stat, get_cache_settings(delimiter, has_header, encoding, quoted),
+               table, number_keys, time_keys, time_fmt)
+
+
+def callback_cache(args: Namespace) -> None:
+    '''Saves tables into columnar cache files on the command line request'''
+    if args.quoted:
+        check_quoted_delimiter(args.delimiter)
+    args.files = get_input_files(args.files)
+    if STDIN_NAME in args.files:
+        raise ValueError("Standard input cannot be cached")
+    for file in args.files:
+        cache_table(file, not args.no_header, args.delimiter, args.encoding,
+                    args.quoted, args.time_fmt)
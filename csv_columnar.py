@@ -0,0 +1,373 @@
+from array import array
+from itertools import compress, count, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import codecs
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+from csv_read_write import FileContent, \
+    StreamContent, \
+    get_encoding
+from csv_compression import STDIN_NAME
+from csv_defaults import DEFAULT_COLUMNAR_BATCH_SIZE
+from csv_utility import split_rows, \
+    join_cells, \
+    select_by_ranges
+
+CACHE_SUFFIX = ".csvcache"
+# magic, cached file size, cached file modification time in ns, metadata size
+_CACHE_HEADER = struct.Struct("<8sQQQ")
+_CACHE_MAGIC = b"CSVCAC01"
+_CACHE_ALIGNMENT = 8
+
+
+class ColumnarContent:
+    '''Alternative to the FileContent, which keeps table rows split into columns.
+    Every column is dictionary encoded: each distinct cell value is stored only once
+    and rows refer to it by an integer code. Filtering and sorting do not touch
+    the columns, they only produce the new order of row indexes, so cell values are
+    joined back into rows only when the table is written.
+    If the source rows are kept in memory anyway (source is set), they are written
+    as they are and no joining is needed at all.
+    If quoted is set, joined values are quoted when it is necessary (see join_cells).
+    '''
+
+    def __init__(self, header: Optional[str], delimiter: str,
+                 values: List[List[str]], codes: List[array],
+                 order: Optional[array] = None,
+                 source: Optional[Sequence[str]] = None,
+                 quoted: bool = False) -> None:
+        self.header = header
+        self.delimiter = delimiter
+        self.quoted = quoted
+        self._values = values
+        self._codes = codes
+        self._source = source
+        if order is None:
+            order = array('L', range(len(codes[0]) if codes else 0))
+        self._order = order
+
+    @property
+    def row_count(self) -> int:
+        return len(self._order)
+
+    @property
+    def column_count(self) -> int:
+        return len(self._values)
+
+    def distinct_values(self, index: int) -> List[str]:
+        '''Returns distinct values of the given column. Position of the value in the list
+        is its code, so the results of a function computed for distinct values
+        can be passed to select and sort.
+        '''
+        return self._values[index]
+
+    def column_codes(self, index: int) -> Sequence[int]:
+        '''Returns codes of the given column values for all rows of the source table.
+        The code is the position of the value in distinct_values.
+        '''
+        return self._codes[index]
+
+    def _row_codes(self, index: int) -> Iterator[int]:
+        return map(self._codes[index].__getitem__, self._order)
+
+    def select(self, index: int, matches: List[bool]) -> 'ColumnarContent':
+        '''Returns the table which contains only those rows, which value in the given column
+        is matched. matches contains the match flag for each distinct value of the column.
+        '''
+        order = array('L', compress(self._order, map(matches.__getitem__, self._row_codes(index))))
+        return ColumnarContent(self.header, self.delimiter, self._values, self._codes,
+                               order, self._source, self.quoted)
+
+    def sort(self, keys: List[Tuple[int, List[Any]]], reverse: bool) -> 'ColumnarContent':
+        '''Returns the table with rows sorted by the given keys. Each key is the pair of
+        column index and the list of comparable keys of all distinct values of this column.
+        The sort is stable in both directions, as the built-in sorted function.
+        '''
+        row_keys = []
+        for index, value_keys in keys:
+            # Equal keys get equal ranks, so rows are compared by integers only
+            ranks = {key: rank for rank, key in enumerate(sorted(set(value_keys)))}
+            code_ranks = [ranks[key] for key in value_keys]
+            row_keys.append(list(map(code_ranks.__getitem__, self._row_codes(index))))
+        if len(row_keys) == 1:
+            row_keys = row_keys[0]
+        else:
+            row_keys = list(zip(*row_keys))
+        positions = sorted(range(self.row_count), key=row_keys.__getitem__, reverse=reverse)
+        order = array('L', map(self._order.__getitem__, positions))
+        return ColumnarContent(self.header, self.delimiter, self._values, self._codes,
+                               order, self._source, self.quoted)
+
+    def rows(self, batch_size: int = DEFAULT_COLUMNAR_BATCH_SIZE) -> Iterator[str]:
+        '''Lazily yields table rows in the current order'''
+        if self._source is not None:
+            yield from map(self._source.__getitem__, self._order)
+            return
+        order = iter(self._order)
+        while True:
+            batch = list(islice(order, batch_size))
+            if not batch:
+                return
+            columns = [_take_values(values, list(map(codes.__getitem__, batch)))
+                       for values, codes in zip(self._values, self._codes)]
+            yield from (join_cells(cells, self.delimiter, self.quoted)
+                        for cells in zip(*columns))
+
+    def rows_in_ranges(self, ranges: List[Tuple[int]]) -> Iterator[str]:
+        '''Lazily yields rows which positions in the current order are covered by the given ranges.
+        Ranges are expected to be sorted and not intersecting (see unite_ranges).
+        '''
+        order = array('L', select_by_ranges(self._order, ranges))
+        return ColumnarContent(self.header, self.delimiter, self._values, self._codes,
+                               order, self._source, self.quoted).rows()
+
+    def to_stream(self) -> StreamContent:
+        '''Returns the content which can be passed to print_table'''
+        return StreamContent(self.header, self.rows())
+
+
+def _take_values(values: Sequence[str], codes: List[int]) -> List[str]:
+    '''Returns values of the given codes. Values which are decoded on access
+    (see CachedValues) are decoded once for every distinct code.
+    '''
+    if not isinstance(values, list):
+        values = {code: values[code] for code in set(codes)}
+    return list(map(values.__getitem__, codes))
+
+
+def split_columns(file_data: Union[FileContent, StreamContent], delimiter: str,
+                  quoted: bool = False,
+                  batch_size: int = DEFAULT_COLUMNAR_BATCH_SIZE) -> Optional[ColumnarContent]:
+    '''Converts the table content into the ColumnarContent splitting every row only once.
+    None is returned if rows of the table have different number of columns.
+    Rows of the FileContent are already kept in memory, so they are reused for writing.
+    If quoted is set, rows are split with respect to quoted values (see split_rows).
+    '''
+    rows: Iterable[List[str]] = split_rows(file_data.content, delimiter, quoted, batch_size)
+    lookups = []
+    codes = []
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        if not codes:
+            lookups = [{} for _ in batch[0]]
+            codes = [array('L') for _ in batch[0]]
+        if any(len(cells) != len(codes) for cells in batch):
+            return None
+        for lookup, column_codes, column in zip(lookups, codes, zip(*batch)):
+            # New values get the next free codes, known values keep their codes
+            new_values = [cell for cell in dict.fromkeys(column) if cell not in lookup]
+            lookup.update(zip(new_values, count(len(lookup))))
+            column_codes.extend(map(lookup.__getitem__, column))
+    source = file_data.content if isinstance(file_data, FileContent) else None
+    return ColumnarContent(file_data.header, delimiter, [list(lookup) for lookup in lookups],
+                           codes, source=source, quoted=quoted)
+
+
+def get_cache_path(filename: str) -> str:
+    '''Returns the path of the columnar cache file for the given table file'''
+    return f"{filename}{CACHE_SUFFIX}"
+
+
+def get_cache_settings(delimiter: str, has_header: bool, encoding: Optional[str],
+                       quoted: bool) -> Dict[str, Any]:
+    '''Returns the table reading settings, which should be the same for the cache
+    and for the request which reads it.
+    '''
+    return {"delimiter": delimiter, "has_header": has_header, "quoted": quoted,
+            "encoding": codecs.lookup(get_encoding(encoding)).name}
+
+
+def _write_aligned(out, data: bytes) -> int:
+    '''Writes data into the file starting at the aligned position and returns this position'''
+    position = out.tell()
+    padding = -position % _CACHE_ALIGNMENT
+    out.write(b"\0" * padding)
+    out.write(data)
+    return position + padding
+
+
+def save_cache(filename: str, stat: os.stat_result, settings: Dict[str, Any],
+               table: ColumnarContent, number_keys: List[Optional[array]],
+               time_keys: List[Optional[array]], time_fmt: str) -> None:
+    '''Saves the columnar table read from the given file into its cache file together with
+    the file size and modification time, which were obtained before the table was read.
+    For each column the cache keeps distinct values, codes of values of all rows,
+    number keys of distinct values and their time keys for the given time format
+    (keys are saved only if they are not None). See TableCache for the reading.
+    The cache is replaced atomically, so concurrent readers never see partially written data.
+    '''
+    path = get_cache_path(filename)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    suffix=CACHE_SUFFIX)
+    try:
+        with os.fdopen(fd, 'w+b') as out:
+            # Metadata describes positions of arrays, so it is written after them
+            out.write(b"\0" * _CACHE_HEADER.size)
+            columns = []
+            for index in range(table.column_count):
+                blobs = [value.encode("utf-8") for value in table.distinct_values(index)]
+                offsets = array('Q', [0])
+                for blob in blobs:
+                    offsets.append(offsets[-1] + len(blob))
+                numbers = number_keys[index]
+                times = time_keys[index]
+                columns.append({
+                    "count": len(blobs),
+                    "offsets": _write_aligned(out, offsets.tobytes()),
+                    "values": _write_aligned(out, b"".join(blobs)),
+                    "numbers": _write_aligned(out, numbers.tobytes()) if numbers is not None else None,
+                    "times": _write_aligned(out, times.tobytes()) if times is not None else None,
+                    "codes": _write_aligned(out, array('I', table.column_codes(index)).tobytes())})
+            metadata = dict(settings, header=table.header, row_count=table.row_count,
+                            time_fmt=time_fmt, columns=columns)
+            metadata_position = _write_aligned(out, json.dumps(metadata).encode("utf-8"))
+            size = out.tell() - metadata_position
+            out.seek(0)
+            out.write(_CACHE_HEADER.pack(_CACHE_MAGIC, stat.st_size, stat.st_mtime_ns, size))
+        # The cache contains the whole table, so it is as accessible as the table itself
+        shutil.copymode(filename, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CachedValues:
+    '''Distinct values of the cached column. Values stay encoded in the memory mapped
+    cache and are decoded only when they are accessed, so opening the cache of the table
+    with many distinct values costs nothing and only values of displayed rows are decoded.
+    '''
+
+    def __init__(self, data: mmap.mmap, position: int, offsets: memoryview) -> None:
+        self._data = data
+        self._position = position
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, code: int) -> str:
+        # Slices of the mapping are cheaper than slices of its memoryview
+        position = self._position
+        return self._data[position + self._offsets[code]:
+                          position + self._offsets[code + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        # All values are needed, so they are decoded at once
+        offsets = self._offsets.tolist()
+        blob = self._data[self._position:self._position + offsets[-1]]
+        text = blob.decode("utf-8")
+        if len(text) != len(blob):
+            # Offsets of values are the byte ones, so non ASCII values are decoded one by one
+            return (blob[begin:end].decode("utf-8") for begin, end in zip(offsets, offsets[1:]))
+        return (text[begin:end] for begin, end in zip(offsets, offsets[1:]))
+
+
+class TableCache:
+    '''Gives access to the table stored in the columnar cache file (see save_cache).
+    The cache is memory mapped, codes, keys and distinct values are read from
+    the mapping directly, values are decoded only when they are accessed (see CachedValues).
+    Use TableCache.open, which checks that the cache is up to date.
+    '''
+
+    def __init__(self, data: mmap.mmap, metadata: Dict[str, Any]) -> None:
+        self._data = data
+        self._view = memoryview(data)
+        self._metadata = metadata
+        self._views = []
+        values = []
+        codes = []
+        try:
+            row_count = metadata["row_count"]
+            for column in metadata["columns"]:
+                offsets = self._array(column["offsets"], 'Q', column["count"] + 1)
+                if column["values"] + offsets[-1] > len(data):
+                    raise ValueError("Values of the column are out of the cache")
+                values.append(CachedValues(data, column["values"], offsets))
+                codes.append(self._array(column["codes"], 'I', row_count))
+        except BaseException:
+            # The mapping can be closed only once nothing refers to it
+            self._release_views()
+            raise
+        self.table = ColumnarContent(metadata["header"], metadata["delimiter"], values, codes,
+                                     quoted=metadata["quoted"])
+
+    @staticmethod
+    def open(filename: str, settings: Dict[str, Any]) -> Optional['TableCache']:
+        '''Maps the cache of the given file into memory. None is returned if there is no cache,
+        it is corrupted, was built for another version of the file or with other settings.
+        '''
+        try:
+            stat = os.stat(filename)
+            with open(get_cache_path(filename), 'rb') as fin:
+                if os.fstat(fin.fileno()).st_size < _CACHE_HEADER.size:
+                    return None
+                data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+        magic, size, mtime_ns, metadata_size = _CACHE_HEADER.unpack_from(data)
+        try:
+            if magic != _CACHE_MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                raise ValueError("The cache is built for another version of the table")
+            metadata = json.loads(bytes(data[len(data) - metadata_size:]).decode("utf-8"))
+            if any(metadata[key] != value for key, value in settings.items()):
+                raise ValueError("The cache is built with other settings")
+            return TableCache(data, metadata)
+        except (ValueError, KeyError, TypeError, IndexError):
+            # Broken metadata is treated as the missing cache
+            data.close()
+            return None
+
+    def _array(self, position: int, typecode: str, length: int) -> memoryview:
+        view = self._view[position:position + length * struct.calcsize(typecode)].cast(typecode)
+        self._views.append(view)
+        return view
+
+    def number_keys(self, index: int) -> Optional[Sequence[float]]:
+        '''Returns number keys of distinct values of the given column or None if they are not cached'''
+        column = self._metadata["columns"][index]
+        if column["numbers"] is None:
+            return None
+        return self._array(column["numbers"], 'd', column["count"])
+
+    def time_keys(self, index: int, time_fmt: str) -> Optional[Sequence[int]]:
+        '''Returns time keys of distinct values of the given column parsed with the given format
+        or None if they are not cached.
+        '''
+        column = self._metadata["columns"][index]
+        if column["times"] is None or time_fmt != self._metadata["time_fmt"]:
+            return None
+        return self._array(column["times"], 'q', column["count"])
+
+    def __enter__(self) -> 'TableCache':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _release_views(self) -> None:
+        for view in self._views:
+            view.release()
+        self._view.release()
+
+    def close(self) -> None:
+        self.table = None
+        self._release_views()
+        self._data.close()
+
+
+def open_table_cache(filename: str, delimiter: str, has_header: bool,
+                     encoding: Optional[str], quoted: bool) -> Optional[TableCache]:
+    '''Returns the cache of the given table if it exists, is up to date and
+    was built with the same reading settings, otherwise None is returned.
+    '''
+    if filename == STDIN_NAME:
+        return None
+    return TableCache.open(filename, get_cache_settings(delimiter, has_header, encoding, quoted))
@@ -0,0 +1,277 @@
+from typing import BinaryIO, Iterator, List, Optional, TextIO
+from contextlib import contextmanager
+from functools import lru_cache
+import bz2
+import gzip
+import io
+import locale
+import lzma
+import os
+import queue
+import re
+import stat
+import sys
+import threading
+
+from csv_defaults import DEFAULT_COMPRESSION_CHUNK_SIZE, \
+    DEFAULT_COMPRESSION_QUEUE_SIZE
+
+# File name which refers to the standard input
+STDIN_NAME = "-"
+_OPENERS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+_COMPRESSORS = {"gzip": lambda out: gzip.GzipFile(fileobj=out, mode='wb'),
+                "bz2": lambda out: bz2.BZ2File(out, 'wb'),
+                "xz": lambda out: lzma.LZMAFile(out, 'wb')}
+# bz2 signature is followed by the block size and the magic of the first block
+# (or of the end of stream), so plain text starting with 'BZh' is not confused with it
+_BZ2_MAGIC = re.compile(rb"BZh[1-9](\x31\x41\x59\x26\x53\x59|\x17\x72\x45\x38\x50\x90)")
+
+
+def is_stream_input(filename: str) -> bool:
+    '''Returns True if the given input can be read only once: it is the standard input
+    or it is not a regular file (a named pipe or a process substitution like /dev/fd/63).
+    Missing files are not streams, the error is reported once they are opened.
+    '''
+    if filename == STDIN_NAME:
+        return True
+    try:
+        return not stat.S_ISREG(os.stat(filename).st_mode)
+    except OSError:
+        return False
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    '''Returns the name of the compression format of the given file
+    ('gzip', 'bz2' or 'xz') according to its magic bytes,
+    or None if the file is not compressed or does not exist.
+    The standard input is checked without consuming any data from it.
+    Other streams (see is_stream_input) cannot be checked without consuming
+    their data, so None is returned for them, they are checked once they are opened.
+    Regular files are read only once until they are modified.
+    '''
+    if filename == STDIN_NAME:
+        return _detect_by_magic(sys.stdin.buffer.peek(10)[:10])
+    try:
+        file_stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None
+    return _detect_file_compression(os.path.abspath(filename), file_stat.st_ino,
+                                    file_stat.st_size, file_stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _detect_file_compression(filename: str, inode: int, size: int,
+                             mtime: int) -> Optional[str]:
+    # The file identity and modification time are the part of the cache key
+    with open(filename, 'rb') as fin:
+        return _detect_by_magic(fin.read(10))
+
+
+def _detect_by_magic(start: bytes) -> Optional[str]:
+    if start.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if start.startswith(b"\xfd7zXZ\x00"):
+        return "xz"
+    if _BZ2_MAGIC.match(start):
+        return "bz2"
+    return None
+
+
+class BackgroundReader(io.RawIOBase):
+    '''Raw binary stream which reads the given source in the background thread.
+    Chunks are passed through the bounded queue, so reading and decompression of the
+    next chunks overlap with processing of the previous ones while memory stays bounded.
+    Errors raised in the background thread are raised again by the reading call.
+    '''
+
+    def __init__(self, source: BinaryIO, chunk_size: int = DEFAULT_COMPRESSION_CHUNK_SIZE,
+                 queue_size: int = DEFAULT_COMPRESSION_QUEUE_SIZE,
+                 underlying: Optional[BinaryIO] = None) -> None:
+        super().__init__()
+        self._source = source
+        # The stream which the source reads from, it is closed together with the source
+        self._underlying = underlying
+        self._chunks = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._produce, args=(chunk_size,),
+                                        daemon=True)
+        self._thread.start()
+
+    def _produce(self, chunk_size: int) -> None:
+        try:
+            while not self._stop.is_set():
+                chunk = self._source.read(chunk_size)
+                self._chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            self._chunks.put(error)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if self._eof:
+                return 0
+            item = self._chunks.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._chunk = memoryview(item)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            # Free the queue, so the background thread is not blocked
+            # and notices the stop request
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.01)
+                except queue.Empty:
+                    pass
+            self._source.close()
+            if self._underlying is not None:
+                self._underlying.close()
+        super().close()
+
+
+class BackgroundWriter(io.RawIOBase):
+    '''Raw binary stream which passes written data to the given target in the background thread.
+    Data is passed through the bounded queue, so the slow target (a compressor, for example)
+    does not stall the code which produces data while memory stays bounded.
+    Errors raised in the background thread are raised again by the next write or by close.
+    The target is not closed.
+    '''
+
+    def __init__(self, target: BinaryIO,
+                 queue_size: int = DEFAULT_COMPRESSION_QUEUE_SIZE) -> None:
+        super().__init__()
+        self._target = target
+        self._chunks = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def _consume(self) -> None:
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            if self._error is not None:
+                # Data is dropped after the failure, the error is reported to the writer
+                continue
+            try:
+                self._target.write(chunk)
+            except Exception as error:
+                self._error = error
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._raise_error()
+        # The caller is allowed to reuse the buffer after the call
+        chunk = bytes(data)
+        self._chunks.put(chunk)
+        return len(chunk)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._chunks.put(None)
+            self._thread.join()
+            super().close()
+            self._raise_error()
+
+
+@contextmanager
+def open_compressed_output(out: BinaryIO, compression: str) -> Iterator[BinaryIO]:
+    '''Returns binary stream which compresses all data written into it with the given
+    compression format and writes it into out. Compression is performed in the background thread.
+    out stays opened when the context is left.
+    '''
+    compressor = _COMPRESSORS[compression](out)
+    try:
+        writer = io.BufferedWriter(BackgroundWriter(compressor), DEFAULT_COMPRESSION_CHUNK_SIZE)
+        try:
+            yield writer
+        finally:
+            writer.close()
+    finally:
+        compressor.close()
+
+
+def _open_decompressed(source: BinaryIO, compression: str,
+                       underlying: Optional[BinaryIO]) -> BinaryIO:
+    return io.BufferedReader(BackgroundReader(_OPENERS[compression](source, 'rb'),
+                                              underlying=underlying),
+                             DEFAULT_COMPRESSION_CHUNK_SIZE)
+
+
+def open_binary_input(filename: str) -> BinaryIO:
+    '''Opens the given file for binary reading. Compressed files are
+    transparently decompressed in the background thread.
+    STDIN_NAME refers to the standard input, which is consumed by the reading.
+    The file is opened only once and its magic bytes are peeked without consuming them,
+    so named pipes and process substitutions are read entirely.
+    '''
+    if filename == STDIN_NAME:
+        source = sys.stdin.buffer
+    else:
+        source = open(filename, 'rb')
+    try:
+        compression = _detect_by_magic(source.peek(10)[:10])
+        if compression is not None:
+            # Unlike the file, the standard input is left open after decompression
+            return _open_decompressed(source, compression,
+                                      source if filename != STDIN_NAME else None)
+    except BaseException:
+        if filename != STDIN_NAME:
+            source.close()
+        raise
+    return source
+
+
+def open_text_input(filename: str, encoding: Optional[str] = None) -> TextIO:
+    '''Opens the given file for reading in text mode with the given encoding
+    (the default one if it is not set). Compressed files are
+    transparently decompressed in the background thread.
+    STDIN_NAME refers to the standard input, which is consumed by the reading.
+    '''
+    return io.TextIOWrapper(open_binary_input(filename),
+                            encoding=encoding or locale.getpreferredencoding(False))
+
+
+def is_seekable_input(filename: str) -> bool:
+    '''Returns True if the given input can be read in random order:
+    it is neither a stream (see is_stream_input) nor a compressed file.
+    '''
+    return not is_stream_input(filename) and detect_compression(filename) is None
+
+
+def get_input_files(files: Optional[List[str]]) -> List[str]:
+    '''Returns the list of input files given by user.
+    If no files are given, the standard input is used.
+    ValueError is raised if the standard input is given more than once,
+    since it can be read only once.
+    '''
+    if not files:
+        return [STDIN_NAME]
+    if files.count(STDIN_NAME) > 1:
+        raise ValueError("Standard input can be given only once")
+    return files
@@ -2,12 +2,23 @@
 DEFAULT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 DEFAULT_TABLE_DELIMITER = "\t"
 DEFAULT_NO_HEADER_ACTION = "store_true"
+DEFAULT_ENCODING = None
+DEFAULT_BYTES_MODE_ACTION = "store_true"
+DEFAULT_QUOTED_ACTION = "store_true"
+DEFAULT_COLUMNAR_ACTION = "store_true"
+DEFAULT_JOBS_NUMBER = 1
 DEFAULT_COLUMN_NAME_LIST = None
 DEFAULT_COLUMN_INDEX_LIST = None
 DEFAULT_INPLACE_ACTION = "store_true"
 DEFAULT_HIDE_HEADER_ACTION = "store_true"
 DEFAULT_COLUMN_TYPE_LIST = None
 DEFAULT_SORT_REVERSE_ACTION = "store_true"
+DEFAULT_SORT_MAX_MEMORY = None
+DEFAULT_SORT_TMP_DIR = None
+DEFAULT_SORT_LIMIT = None
+DEFAULT_SORT_CACHE_STATS_ACTION = "store_true"
+DEFAULT_SORT_NUMPY_ACTION = "store_true"
+DEFAULT_SORT_BINARY_KEYS_ACTION = "store_true"
 DEFAULT_SHOW_ROW_HEAD_NUMBER = None
 DEFAULT_SHOW_ROW_TAIL_NUMBER = None
 DEFAULT_SHOW_COL_HEAD_NUMBER = None
@@ -18,5 +29,18 @@ DEFAULT_SHOW_FROM_COL = None
 DEFAULT_SHOW_TO_COL = None
 DEFAULT_SHOW_ROW_INDEX = None
 DEFAULT_SHOW_EXCEPT_ACTION = "store_true"
+DEFAULT_SHOW_USE_INDEX_ACTION = "store_true"
 DEFAULT_REGEX_EXPRESSION = None
 DEFAULT_REGEX_IGNORE_CASE_ACTION = "store_true"
+DEFAULT_TAIL_BLOCK_SIZE = 1 << 16
+DEFAULT_WRITE_BATCH_SIZE = 4096
+DEFAULT_COMPRESSION_CHUNK_SIZE = 1 << 20
+DEFAULT_COMPRESSION_QUEUE_SIZE = 8
+DEFAULT_COLUMNAR_BATCH_SIZE = 4096
+DEFAULT_SPLIT_BLOCK_SIZE = 4096
+DEFAULT_PARALLEL_CHUNK_SIZE = 1 << 26
+DEFAULT_PARALLEL_CHUNK_ROWS = 1 << 18
+DEFAULT_PIPELINE_BATCH_SIZE = 4096
+DEFAULT_PIPELINE_QUEUE_SIZE = 8
+DEFAULT_SPILL_BATCH_SIZE = 1024
+DEFAULT_CONVERSION_CACHE_SIZE = 1 << 16
@@ -0,0 +1,98 @@
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+from itertools import islice
+from operator import itemgetter
+import heapq
+import pickle
+import sys
+import tempfile
+
+from csv_defaults import DEFAULT_SPILL_BATCH_SIZE
+
+_SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text: str) -> int:
+    '''Converts the memory size like 512M or 64G (binary units) or the plain number
+    of bytes into the number of bytes. ValueError is raised for other strings.
+    '''
+    text = text.strip().upper()
+    multiplier = 1
+    if text.endswith("B"):
+        text = text[:-1]
+    if text and text[-1] in _SIZE_SUFFIXES:
+        multiplier = _SIZE_SUFFIXES[text[-1]]
+        text = text[:-1]
+    size = int(float(text) * multiplier)
+    if size <= 0:
+        raise ValueError("Memory size should be positive")
+    return size
+
+
+def write_run(pairs: Iterable[Tuple[Any, str]], tmp_dir: Optional[str],
+              batch_size: int = DEFAULT_SPILL_BATCH_SIZE) -> BinaryIO:
+    '''Writes the sorted pairs of keys and rows into the anonymous temporary file
+    in the given directory (the system one if it is None) and returns this file
+    ready for reading. Pairs are pickled by batches, so they can be read back lazily.
+    '''
+    run = tempfile.TemporaryFile(dir=tmp_dir, prefix=".csv_sort.")
+    try:
+        pairs = iter(pairs)
+        while True:
+            batch = list(islice(pairs, batch_size))
+            if not batch:
+                break
+            pickle.dump(batch, run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+    except BaseException:
+        run.close()
+        raise
+    return run
+
+
+def read_run(run: BinaryIO) -> Iterator[Tuple[Any, str]]:
+    '''Lazily yields pairs of keys and rows written by write_run and closes the file'''
+    with run:
+        while True:
+            try:
+                batch = pickle.load(run)
+            except EOFError:
+                return
+            yield from batch
+
+
+def sort_externally(rows: Iterable[str], get_keys: Callable[[List[str]], List[Any]],
+                    rev_order: bool, max_memory: int, tmp_dir: Optional[str] = None,
+                    batch_size: int = DEFAULT_SPILL_BATCH_SIZE) -> Iterator[str]:
+    '''Lazily yields the given rows sorted by keys in the same order as the built-in
+    stable sorted function does. get_keys returns sort keys of the given list of rows.
+    Rows are read into memory until they take about half of max_memory (the rest is left
+    for their keys), then they are sorted and written into a temporary file (the run).
+    Runs are merged at the end, ties are resolved in favour of the earlier run, so the
+    result is stable. If all rows fit into memory, nothing is written at all.
+    '''
+    rows = iter(rows)
+    runs = []
+    try:
+        while True:
+            chunk = []
+            size = 0
+            for row in rows:
+                chunk.append(row)
+                size += sys.getsizeof(row)
+                if size * 2 >= max_memory:
+                    break
+            pairs = sorted(zip(get_keys(chunk), chunk), key=itemgetter(0), reverse=rev_order)
+            del chunk
+            if len(pairs) == 0 or size * 2 < max_memory:
+                # The last chunk is merged directly from memory
+                break
+            runs.append(write_run(pairs, tmp_dir, batch_size))
+            del pairs
+        if not runs:
+            yield from map(itemgetter(1), pairs)
+            return
+        merged = heapq.merge(*map(read_run, runs), pairs, key=itemgetter(0), reverse=rev_order)
+        yield from map(itemgetter(1), merged)
+    finally:
+        for run in runs:
+            run.close()
@@ -0,0 +1,167 @@
+from array import array
+from typing import Iterator, List, Optional, Tuple, Union
+import mmap
+import os
+import struct
+import tempfile
+
+from csv_read_write import decode_line, \
+    strip_line_end, \
+    get_encoding
+
+SIDECAR_SUFFIX = ".csvidx"
+# magic, indexed file size, indexed file modification time in ns, number of lines
+_SIDECAR_HEADER = struct.Struct("<8sQQQ")
+_SIDECAR_MAGIC = b"CSVIDX01"
+
+
+def build_line_offsets(data: bytes, limit: Optional[int] = None) -> array:
+    '''Returns the array with offsets of line beginnings in the given data.
+    Lines are separated by the new line symbol. New line symbol at the very end
+    of the data does not start a new line. Empty data contains no lines.
+    If limit is set, the scan stops as soon as offsets of the first limit lines are found.
+    '''
+    offsets = array('Q')
+    size = len(data)
+    if size == 0 or limit == 0:
+        return offsets
+    offsets.append(0)
+    position = data.find(b'\n')
+    while position != -1 and position + 1 < size and len(offsets) != limit:
+        offsets.append(position + 1)
+        position = data.find(b'\n', position + 1)
+    return offsets
+
+
+def get_sidecar_path(filename: str) -> str:
+    '''Returns the path of the sidecar index file for the given table file'''
+    return f"{filename}{SIDECAR_SUFFIX}"
+
+
+def save_sidecar(filename: str, offsets: array, stat: os.stat_result) -> None:
+    '''Saves line offsets of the given file into its sidecar index together with
+    the file size and modification time, which were obtained before offsets calculation.
+    The sidecar is replaced atomically, so concurrent readers never see partially written index.
+    If the sidecar cannot be written (read only directory, etc.) nothing happens.
+    '''
+    path = get_sidecar_path(filename)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        suffix=SIDECAR_SUFFIX)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(_SIDECAR_HEADER.pack(_SIDECAR_MAGIC, stat.st_size,
+                                           stat.st_mtime_ns, len(offsets)))
+            out.write(offsets.tobytes())
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+
+
+def load_sidecar(filename: str, stat: os.stat_result) -> Optional[Tuple[mmap.mmap, memoryview]]:
+    '''Maps the sidecar index of the given file into memory and returns the mapping
+    together with the view on line offsets stored in it.
+    None is returned if the sidecar does not exist, is corrupted or
+    was built for another version of the file.
+    '''
+    try:
+        with open(get_sidecar_path(filename), 'rb') as fin:
+            index_size = os.fstat(fin.fileno()).st_size
+            if index_size < _SIDECAR_HEADER.size:
+                return None
+            index_map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+    magic, size, mtime_ns, count = _SIDECAR_HEADER.unpack_from(index_map)
+    if (magic != _SIDECAR_MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns
+            or index_size != _SIDECAR_HEADER.size + count * 8):
+        index_map.close()
+        return None
+    return index_map, memoryview(index_map)[_SIDECAR_HEADER.size:].cast('Q')
+
+
+class IndexedTable:
+    '''Gives random access to the rows of the table stored in the file.
+    The file is memory mapped and only the compact array of line offsets is
+    kept in memory. Rows are decoded only when they are requested.
+    If use_sidecar is set, line offsets are taken from the sidecar index file
+    instead of scanning the table. Missing or stale sidecar is rebuilt.
+    Otherwise, if row_limit is set, only the first row_limit rows are indexed
+    and available for reading.
+    Rows are decoded with the given encoding or returned as raw bytes if binary is set.
+    '''
+
+    def __init__(self, filename: str, has_header: bool, use_sidecar: bool = False,
+                 row_limit: Optional[int] = None, encoding: Optional[str] = None,
+                 binary: bool = False) -> None:
+        self._file = open(filename, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._size = stat.st_size
+        # Empty file cannot be memory mapped
+        self._data = (mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                      if self._size > 0 else b'')
+        self._encoding = get_encoding(encoding)
+        self._binary = binary
+        self._index_map = None
+        self._offsets: Union[array, memoryview]
+        sidecar = load_sidecar(filename, stat) if use_sidecar else None
+        if sidecar is not None:
+            self._index_map, self._offsets = sidecar
+        elif use_sidecar:
+            self._offsets = build_line_offsets(self._data)
+            save_sidecar(filename, self._offsets, stat)
+        else:
+            line_limit = None
+            if row_limit is not None:
+                line_limit = row_limit + 1 if has_header else row_limit
+            self._offsets = build_line_offsets(self._data, line_limit)
+        self._first_row = 0
+        self.header = None
+        if has_header:
+            empty_line = b"" if binary else ""
+            self.header = self._line(0) if len(self._offsets) > 0 else empty_line
+            self._first_row = min(1, len(self._offsets))
+        self.row_count = len(self._offsets) - self._first_row
+
+    def __enter__(self) -> 'IndexedTable':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._index_map is not None:
+            self._offsets.release()
+            self._index_map.close()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def _line(self, line_index: int) -> Union[str, bytes]:
+        begin = self._offsets[line_index]
+        if line_index + 1 < len(self._offsets):
+            end = self._offsets[line_index + 1]
+        else:
+            # The last indexed line is not necessarily the last line in the file
+            end = self._data.find(b'\n', begin) + 1 or self._size
+        if self._binary:
+            return strip_line_end(self._data[begin:end])
+        return decode_line(self._data[begin:end], self._encoding)
+
+    def row(self, index: int) -> Optional[Union[str, bytes]]:
+        '''Returns the table row with the given index (header is not counted)
+        or None if there is no such row.
+        '''
+        if index < 0 or index >= self.row_count:
+            return None
+        return self._line(self._first_row + index)
+
+    def rows(self, ranges: List[Tuple[int]]) -> Iterator[Union[str, bytes]]:
+        '''Lazily yields rows which indexes are covered by the given ranges.
+        Ranges are expected to be sorted and not intersecting.
+        '''
+        for begin, end in ranges:
+            for index in range(max(begin, 0), min(end, self.row_count)):
+                yield self._line(self._first_row + index)
@@ -0,0 +1,33 @@
+import struct
+
+_DOUBLE = struct.Struct(">d")
+_UNSIGNED = struct.Struct(">Q")
+_SIGN_BIT = 1 << 63
+_ALL_BITS = (1 << 64) - 1
+# Zero bytes of strings are escaped, so the terminator is less than any continuation
+_STRING_TERMINATOR = b"\x00\x00"
+
+
+def encode_number(value: float) -> bytes:
+    '''Encodes the number (not NaN) into 8 bytes which are compared in the same order
+    as numbers themselves: the sign bit of positive numbers is set, all bits of
+    negative numbers are inverted. Negative zero is encoded as zero, since they are equal.'''
+    bits = _UNSIGNED.unpack(_DOUBLE.pack(value + 0.0))[0]
+    bits = bits ^ _ALL_BITS if bits & _SIGN_BIT else bits | _SIGN_BIT
+    return _UNSIGNED.pack(bits)
+
+
+def encode_integer(value: int) -> bytes:
+    '''Encodes the signed 64-bit integer (e.g. the time key) into 8 bytes
+    which are compared in the same order as integers.'''
+    return _UNSIGNED.pack(value + _SIGN_BIT)
+
+
+def encode_string(value: str) -> bytes:
+    '''Encodes the string into bytes which are compared in the same order as strings.
+    UTF-8 keeps the order of code points (surrogates are kept as well), zero bytes are
+    escaped and the terminator is appended, so the shorter string goes before
+    the longer one with the same prefix whatever follows the encoded string.'''
+    return (value.encode("utf-8", "surrogatepass").replace(b"\x00", b"\x00\x01")
+            + _STRING_TERMINATOR)
+
@@ -0,0 +1,55 @@
+from typing import Any, Callable, Iterable, List, Sequence
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def is_numpy_available() -> bool:
+    '''Returns True if NumPy is installed, so tables can be sorted by it'''
+    return numpy is not None
+
+
+def number_array(values: Sequence[str], convert: Callable[[str], float]) -> 'numpy.ndarray':
+    '''Converts the values into the float64 array in the same way as convert does it.
+    Values are converted by NumPy at once (it uses the same rules as the float function),
+    only if some of them are not numbers, the values are converted one by one.
+    NaN values are replaced by infinity, as RowSorter does it.
+    '''
+    try:
+        res = numpy.array(values, dtype=numpy.float64)
+    except ValueError:
+        return numpy.fromiter(map(convert, values), dtype=numpy.float64, count=len(values))
+    res[numpy.isnan(res)] = math.inf
+    return res
+
+
+def key_array(keys: Iterable[int], count: int) -> 'numpy.ndarray':
+    '''Converts integer keys (e.g. time keys) into the int64 array'''
+    return numpy.fromiter(keys, dtype=numpy.int64, count=count)
+
+
+def rank_array(values: Sequence[Any]) -> 'numpy.ndarray':
+    '''Replaces every value by its rank among distinct values. Ranks have the same order as
+    values, so values which NumPy cannot compare in the same way as Python does (e.g. strings)
+    can be sorted.
+    '''
+    ranks = {value: rank for rank, value in enumerate(sorted(set(values)))}
+    return numpy.fromiter(map(ranks.__getitem__, values), dtype=numpy.int64, count=len(values))
+
+
+def stable_order(columns: List['numpy.ndarray'], reverse: bool) -> List[int]:
+    '''Returns positions of rows sorted by the given key columns (the first column is compared
+    first) in the same order as the stable built-in sorted function gives them.
+    In the reversed order rows with equal keys keep their relative order as well.
+    '''
+    if reverse:
+        columns = [numpy.negative(column) for column in columns]
+    if len(columns) == 1:
+        order = numpy.argsort(columns[0], kind="stable")
+    else:
+        # The last key is the primary one for lexsort
+        order = numpy.lexsort(columns[::-1])
+    return order.tolist()
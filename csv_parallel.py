@@ -0,0 +1,163 @@
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import locale
+import os
+import shutil
+import sys
+import tempfile
+
+from csv_compression import is_seekable_input, \
+    is_stream_input
+from csv_read_write import strip_line_end, \
+    supports_bytes_mode
+from csv_defaults import DEFAULT_PARALLEL_CHUNK_SIZE, \
+    DEFAULT_PARALLEL_CHUNK_ROWS
+
+
+def can_process_in_parallel(filename: str, encoding: str, jobs: int) -> bool:
+    '''Returns True if the given file can be cut into byte ranges processed in parallel.
+    It requires more than one job, the file which can be read from any position and
+    the encoding in which new line symbols can be found in the raw data.
+    '''
+    return jobs > 1 and is_seekable_input(filename) and supports_bytes_mode(encoding)
+
+
+def read_raw_header(filename: str, has_header: bool) -> Tuple[Optional[bytes], int]:
+    '''Returns the raw header of the given file (None if there is no header)
+    together with the offset of the first table row.
+    '''
+    if not has_header:
+        return None, 0
+    with open(filename, 'rb') as fin:
+        header = fin.readline()
+    return strip_line_end(header), len(header)
+
+
+def split_into_ranges(filename: str, start: int, jobs: int,
+                      chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    '''Cuts the file from the start offset to its end into byte ranges which begin and
+    end at row boundaries. There are at least jobs ranges (unless the file is too small)
+    and none of them is much larger than chunk_size, so the memory used by a worker is bounded.
+    Ranges are sorted and do not intersect, empty ones are omitted.
+    '''
+    size = os.path.getsize(filename)
+    if size <= start:
+        return []
+    count = max(jobs, -(-(size - start) // chunk_size))
+    step = -(-(size - start) // count)
+    edges = [start]
+    with open(filename, 'rb') as fin:
+        for position in range(start + step, size, step):
+            if position <= edges[-1]:
+                continue
+            # Range edge is moved to the beginning of the next row
+            fin.seek(position - 1)
+            fin.readline()
+            edges.append(fin.tell())
+    edges.append(size)
+    return [(begin, end) for begin, end in zip(edges, edges[1:]) if begin < end]
+
+
+def split_into_chunks(items: Sequence[Any], jobs: int,
+                      chunk_size: int = DEFAULT_PARALLEL_CHUNK_ROWS) -> List[Sequence[Any]]:
+    '''Cuts the sequence into consecutive chunks in the same way as split_into_ranges cuts
+    the file: there are at least jobs chunks (unless there are fewer items) and none of them
+    contains more than chunk_size items. Empty chunks are omitted.
+    '''
+    if not items:
+        return []
+    count = max(jobs, -(-len(items) // chunk_size))
+    step = -(-len(items) // count)
+    return [items[begin:begin + step] for begin in range(0, len(items), step)]
+
+
+def read_range(filename: str, begin: int, end: int) -> Iterator[bytes]:
+    '''Lazily yields raw rows which start within the given byte range of the file
+    without the trailing new line symbols.
+    '''
+    with open(filename, 'rb') as fin:
+        fin.seek(begin)
+        position = begin
+        for line in fin:
+            if position >= end:
+                return
+            position += len(line)
+            yield strip_line_end(line)
+
+
+def map_ordered(function: Callable[[Any], Any], items: Iterable[Any],
+                jobs: int) -> Iterator[Any]:
+    '''Lazily yields results of the function applied to each item in the order of items.
+    Items are processed by the pool of jobs processes. The number of items submitted
+    ahead of the consumed one is bounded, so results are not accumulated in memory
+    if they are consumed slower than they are produced.
+    function should be picklable, e.g. a partial of a module level function.
+    '''
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        items = iter(items)
+        pending = deque(executor.submit(function, item) for _, item in zip(range(2 * jobs), items))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in items:
+                    pending.append(executor.submit(function, item))
+                    break
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def can_process_files_in_parallel(files: List[str], jobs: int) -> bool:
+    '''Returns True if the given files can be processed concurrently by several processes.
+    The standard input and other streams (see is_stream_input) are always read by the main process.
+    '''
+    return jobs > 1 and len(files) > 1 and not any(map(is_stream_input, files))
+
+
+def _process_file_to(directory: str, encoding: str, errors: str,
+                     function: Callable[[str, int], None], file: str) -> str:
+    '''Calls the function for the given file in the worker process redirecting everything
+    it prints into the temporary file in the given directory. Printed text is encoded
+    in the same way the standard output of the main process does it.
+    Returns the path to the temporary file.
+    '''
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".out")
+    stdout = sys.stdout
+    with open(fd, 'w', encoding=encoding, errors=errors, newline='') as out:
+        sys.stdout = out
+        try:
+            function(file, 1)
+        finally:
+            sys.stdout = stdout
+    return path
+
+
+def process_files(function: Callable[[str, int], None], files: List[str], jobs: int) -> None:
+    '''Calls the function for each of the given files. The function gets the file name and
+    the number of jobs it can use for this file. If files can be processed concurrently
+    (see can_process_files_in_parallel), they are processed by the pool of jobs processes
+    with one job per file. Output of every file is collected in a temporary file and
+    printed by the main process in the order of files, so it is the same as if the files were
+    processed one after another. Files modified inplace are still written by their own workers.
+    '''
+    if not can_process_files_in_parallel(files, jobs):
+        for file in files:
+            function(file, jobs)
+        return
+    sys.stdout.flush()
+    out = getattr(sys.stdout, 'buffer', None)
+    encoding = getattr(sys.stdout, 'encoding', None) or locale.getpreferredencoding(False)
+    errors = getattr(sys.stdout, 'errors', None) or 'strict'
+    with tempfile.TemporaryDirectory(prefix=".csv_output.") as directory:
+        worker = partial(_process_file_to, directory, encoding, errors, function)
+        for path in map_ordered(worker, files, jobs):
+            with open(path, 'rb') as fin:
+                if out is not None:
+                    shutil.copyfileobj(fin, out)
+                else:
+                    sys.stdout.write(fin.read().decode(encoding, errors))
+            os.unlink(path)
+    (out if out is not None else sys.stdout).flush()
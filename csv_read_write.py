@@ -1,5 +1,26 @@
 
-from typing import NamedTuple, Optional, Tuple
+from typing import NamedTuple, Optional, Tuple, Iterator, Iterable, TextIO, BinaryIO, Union, AnyStr
+from itertools import chain, islice
+from contextlib import contextmanager
+import codecs
+import locale
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+
+from csv_compression import BackgroundWriter, \
+    detect_compression, \
+    open_text_input, \
+    open_binary_input, \
+    open_compressed_output
+from csv_defaults import DEFAULT_TAIL_BLOCK_SIZE, \
+    DEFAULT_WRITE_BATCH_SIZE, \
+    DEFAULT_PIPELINE_BATCH_SIZE, \
+    DEFAULT_PIPELINE_QUEUE_SIZE
+from csv_utility import split_row
 
 
 class FileContent(NamedTuple):
@@ -7,6 +28,11 @@ class FileContent(NamedTuple):
     content: Tuple[str]
 
 
+class StreamContent(NamedTuple):
+    header: Optional[str]
+    content: Iterator[str]
+
+
 def convert_to_text(file_data: FileContent, hide_header: bool) -> str:
     '''Puts all data from the file content class into single string.
     If hide_header is True there will be no header in the result
@@ -29,16 +55,195 @@ def convert_to_text(file_data: FileContent, hide_header: bool) -> str:
         return '\n'.join((header, *file_data.content))
 
 
-def read_file(filename: str, has_header: bool) -> FileContent:
+def get_encoding(encoding: Optional[str]) -> str:
+    '''Returns the given table encoding or the default one if it is not set'''
+    return encoding if encoding else locale.getpreferredencoding(False)
+
+
+def supports_bytes_mode(encoding: str) -> bool:
+    '''Returns True if the table in the given encoding can be processed without decoding.
+    It is so if every byte which looks like an ASCII symbol really represents this symbol,
+    therefore new lines and delimiters can be found directly in the raw data.
+    '''
+    name = codecs.lookup(encoding).name
+    return name in ("utf-8", "ascii") or name.startswith(("iso8859-", "cp125"))
+
+
+def can_use_bytes_mode(encoding: str, inplace: bool) -> bool:
+    '''Returns True if the table in the given encoding can be processed as raw bytes
+    and the result can be saved into the file (inplace) or printed into the stdout
+    without any changes, producing the same output as processing of decoded data.
+    '''
+    if not supports_bytes_mode(encoding):
+        return False
+    if inplace:
+        return True
+    out_encoding = getattr(sys.stdout, 'encoding', None)
+    return (hasattr(sys.stdout, 'buffer') and out_encoding is not None
+            and codecs.lookup(out_encoding).name == codecs.lookup(encoding).name)
+
+
+def read_file(filename: str, has_header: bool, encoding: Optional[str] = None) -> FileContent:
     '''Converts the content of the given file into an instance of the FileContent
     '''
-    with open(filename, 'r') as fin:
+    with open_text_input(filename, encoding) as fin:
         header = None
         if has_header:
             header = fin.readline().rstrip('\n')
         return FileContent(header, tuple(l.rstrip('\n') for l in fin))
 
 
+def _iterate_lines(fin: TextIO) -> Iterator[str]:
+    '''Yields lines of the opened file without the trailing new line symbol.
+    The file is closed as soon as all lines are read.
+    '''
+    with fin:
+        for line in fin:
+            yield line.rstrip('\n')
+
+
+def stream_file(filename: str, has_header: bool,
+                encoding: Optional[str] = None) -> StreamContent:
+    '''Reads only the header of the given file and returns it together with
+    the lazy iterator over the rest of the file rows. Rows are read from the
+    disk one by one while the iterator is consumed.
+    '''
+    fin = open_text_input(filename, encoding)
+    header = None
+    if has_header:
+        header = fin.readline().rstrip('\n')
+    return StreamContent(header, _iterate_lines(fin))
+
+
+def strip_line_end(line: bytes) -> bytes:
+    '''Removes the trailing new line symbol from the line read in binary mode
+    in the same way it is done for the line read in text mode.
+    '''
+    if line.endswith(b'\n'):
+        line = line[:-1]
+        # Text mode reading translates windows line endings
+        if line.endswith(b'\r'):
+            line = line[:-1]
+    return line
+
+
+def decode_line(line: bytes, encoding: str) -> str:
+    '''Decodes the line read in binary mode in the same way it would be returned
+    from the file opened in text mode, with the trailing new line symbol removed.
+    '''
+    return strip_line_end(line).decode(encoding)
+
+
+def _iterate_binary_lines(fin: BinaryIO) -> Iterator[bytes]:
+    with fin:
+        for line in fin:
+            yield strip_line_end(line)
+
+
+def stream_file_bytes(filename: str, has_header: bool) -> StreamContent:
+    '''Works as stream_file but returns header and rows as raw bytes without decoding them.
+    Should be used only for encodings which satisfy supports_bytes_mode.
+    '''
+    fin = open_binary_input(filename)
+    header = None
+    if has_header:
+        header = strip_line_end(fin.readline())
+    return StreamContent(header, _iterate_binary_lines(fin))
+
+
+def read_ahead(rows: Iterable[AnyStr], batch_size: int = DEFAULT_PIPELINE_BATCH_SIZE,
+               queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE) -> Iterator[AnyStr]:
+    '''Lazily yields rows of the given iterator, which are read by batches in the background
+    thread as soon as the first row is requested. Batches are passed through the bounded queue,
+    so reading of the next rows overlaps with processing of the previous ones while memory
+    stays bounded. Errors raised in the background thread are raised again by the iteration.
+    The given iterator is closed (if it can be) when the result is exhausted or closed.
+    '''
+    source = rows
+    rows = iter(rows)
+    batches = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            while not stop.is_set():
+                batch = list(islice(rows, batch_size))
+                batches.put(batch)
+                if not batch:
+                    return
+        except Exception as error:
+            batches.put(error)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if isinstance(batch, Exception):
+                raise batch
+            if not batch:
+                return
+            yield from batch
+    finally:
+        stop.set()
+        # Free the queue, so the background thread is not blocked
+        # and notices the stop request
+        while thread.is_alive():
+            try:
+                batches.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        if hasattr(source, 'close'):
+            source.close()
+
+
+def read_tail(filename: str, has_header: bool, row_count: int,
+              block_size: int = DEFAULT_TAIL_BLOCK_SIZE,
+              encoding: Optional[str] = None) -> FileContent:
+    '''Returns the FileContent instance which contains the header and only
+    the last row_count rows of the given file. The file is read backwards from its end
+    by blocks until the requested number of rows is found, therefore the
+    time does not depend on the file size.
+    '''
+    encoding = get_encoding(encoding)
+    with open(filename, 'rb') as fin:
+        header = None
+        if has_header:
+            header = decode_line(fin.readline(), encoding)
+        data_start = fin.tell()
+        position = fin.seek(0, os.SEEK_END)
+        if row_count == 0 or position == data_start:
+            return FileContent(header, tuple())
+        blocks = []
+        boundaries = 0
+        while position > data_start and boundaries < row_count:
+            read_size = min(block_size, position - data_start)
+            position -= read_size
+            fin.seek(position)
+            block = fin.read(read_size)
+            # New line symbol at the very end of file does not start a new row
+            boundaries += block.count(b'\n', 0, len(block) - 1 if not blocks else len(block))
+            blocks.append(block)
+    lines = b''.join(reversed(blocks)).split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    if position > data_start:
+        # The first line is read only partially
+        lines = lines[1:]
+    # Lines are complete, so new line symbols are returned back to handle windows line endings
+    return FileContent(header, tuple(decode_line(l + b'\n', encoding) for l in lines[-row_count:]))
+
+
+def peek_first_row(rows: Iterator[str]) -> Tuple[Optional[str], Iterator[str]]:
+    '''Returns the first row from the given iterator (None if there are no rows)
+    together with the iterator which still yields all rows including the first one.
+    '''
+    first = next(rows, None)
+    if first is None:
+        return None, rows
+    return first, chain((first,), rows)
+
+
 def print_to_std_out(content: str, filename: str,
                      need_to_mark_filename: bool) -> None:
     '''Prints file content into stdout, indicating the beginning of the table
@@ -50,30 +255,176 @@ def print_to_std_out(content: str, filename: str,
         print(content)
 
 
+def get_text_lines(file_data: Union[FileContent, StreamContent],
+                   hide_header: bool) -> Iterable[str]:
+    '''Returns the lines of the table text in the same way as convert_to_text
+    forms them, but without joining them into a single string.
+    '''
+    # Empty line in header is not considered as a valid header
+    header = None if hide_header else file_data.header
+    return chain((header,), file_data.content) if header else file_data.content
+
+
+def write_lines(out: Union[BinaryIO, TextIO], lines: Iterable[Union[str, bytes]],
+                encoding: Optional[str], errors: str = 'strict',
+                terminate: bool = True,
+                batch_size: int = DEFAULT_WRITE_BATCH_SIZE) -> bool:
+    '''Writes lines separated by the new line symbol into the given stream.
+    If terminate is set the last line is also followed by the new line symbol.
+    Lines are consumed and written by batches, each batch is joined, encoded
+    and passed to the stream by a single call. If encoding is None the stream is
+    considered to be a text one and batches are written without encoding.
+    Lines given as bytes are written into the binary stream as they are.
+    Returns True if at least one line was written.
+    '''
+    lines = iter(lines)
+    written = False
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return written
+        binary = isinstance(batch[0], bytes)
+        separator = b'\n' if binary else '\n'
+        if terminate:
+            batch.append(separator[:0])
+        elif written:
+            batch.insert(0, separator[:0])
+        data = separator.join(batch)
+        out.write(data if binary or encoding is None else data.encode(encoding, errors))
+        written = True
+
+
+@contextmanager
+def write_in_background(out: BinaryIO, enabled: bool = True,
+                        queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE) -> Iterator[BinaryIO]:
+    '''Returns binary stream which passes all data written into it to out in the background
+    thread, so slow writing overlaps with producing of the next data. The number of
+    pending writes is bounded by queue_size. If enabled is not set, out itself is returned.
+    out stays opened when the context is left.
+    '''
+    if not enabled:
+        yield out
+        return
+    writer = BackgroundWriter(out, queue_size)
+    try:
+        yield writer
+    finally:
+        writer.close()
+
+
+def print_stream_to_std_out(file_data: Union[FileContent, StreamContent], filename: str,
+                            need_to_mark_filename: bool, hide_header: bool,
+                            background: bool = False) -> None:
+    '''Prints rows into stdout as soon as they are produced by the content iterator.
+    The output is identical to the one produced by print_to_std_out for the
+    text of the corresponding FileContent instance.
+    If background is set, rows are written into stdout by the background thread.
+    '''
+    sys.stdout.flush()
+    out = getattr(sys.stdout, 'buffer', None)
+    encoding = sys.stdout.encoding if out is not None else None
+    errors = sys.stdout.errors or 'strict'
+    if out is None:
+        out = sys.stdout
+    terminator = '\n' if encoding is None else b'\n'
+    # Only binary stream can be written in background
+    with write_in_background(out, background and encoding is not None) as target:
+        if need_to_mark_filename:
+            marker = f"==> {filename} <==\n"
+            target.write(marker if encoding is None else marker.encode(encoding, errors))
+        if not write_lines(target, get_text_lines(file_data, hide_header), encoding, errors):
+            target.write(terminator)
+        if need_to_mark_filename:
+            target.write(terminator)
+    out.flush()
+
+
+def count_columns(header: Optional[str], first_row: Optional[str],
+                  delimiter: str, quoted: bool = False) -> int:
+    '''Returns the number of columns defined by the header (if one exists)
+    or by the first table row after header.
+    If quoted is set, delimiters inside quoted values are not counted.
+    '''
+    row = header if header is not None else first_row
+    if row is None:
+        return 1
+    if quoted:
+        return len(split_row(row, delimiter, quoted))
+    return row.count(delimiter) + 1
+
+
 def get_column_count(fc: FileContent, delimiter: str) -> int:
     '''Returns the number of columns in the given file content instance
     according to the user provided delimiter. Note that returned column number
     is defined by the header (if one exists) or by the first table row after header.
     Empty file has 0 columns.
     '''
-    if fc.header is not None:
-        return fc.header.count(delimiter) + 1
-    if len(fc.content) > 0:
-        return fc.content[0].count(delimiter) + 1
-    return 1
+    return count_columns(fc.header, fc.content[0] if len(fc.content) > 0 else None,
+                         delimiter)
+
+
+@contextmanager
+def open_for_replace(filename: str) -> Iterator[BinaryIO]:
+    '''Opens a temporary file for binary writing in the directory of the given file.
+    If the context is left without errors, the temporary file is flushed to the disk
+    and atomically replaces the given file, keeping its permissions.
+    Otherwise the temporary file is removed and the given file stays untouched.
+    '''
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                    prefix=f".{os.path.basename(filename)}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            yield out
+            out.flush()
+            os.fsync(out.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp_path)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    try:
+        # Make the rename itself durable, not possible on some platforms
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
 
 
-def print_table(file_data: FileContent, filename: str,
+def print_table(file_data: Union[FileContent, StreamContent], filename: str,
                 need_to_mark_filename: bool, inplace: bool,
-                hide_header: bool) -> None:
+                hide_header: bool, encoding: Optional[str] = None,
+                background: bool = False) -> None:
     '''Saves the table content into the file or prints it into the stdout
     according to the given parameters.
     need_to_mark_filename is relevant only for printing into std out case.
     If it is true than the file content will be prepended by the file name.
+    Inplace saving streams the content into a temporary file which replaces
+    the original one only after everything is written, therefore content can be
+    lazily read from the file which is being replaced.
+    Compressed file is saved compressed with the same format.
+    encoding is used for saving the file, content given as bytes is saved as it is.
+    If background is set, the content is written by the background thread.
     '''
     if inplace:
-        with open(filename, 'w') as out:
-            out.write(convert_to_text(file_data, hide_header=False))
+        compression = detect_compression(filename)
+        lines = get_text_lines(file_data, hide_header=False)
+        encoding = get_encoding(encoding)
+        with open_for_replace(filename) as out:
+            if compression is None:
+                with write_in_background(out, background) as target:
+                    write_lines(target, lines, encoding, terminate=False)
+            else:
+                # Compressed output is always written in background
+                with open_compressed_output(out, compression) as compressed:
+                    write_lines(compressed, lines, encoding, terminate=False)
         return
-    print_to_std_out(convert_to_text(file_data, hide_header), filename,
-                     need_to_mark_filename)
+    print_stream_to_std_out(file_data, filename, need_to_mark_filename, hide_header, background)
@@ -1,14 +1,37 @@
 from argparse import Namespace
-from typing import List
+from typing import Dict, List, Iterable, Iterator, Optional, AnyStr, Tuple
+from itertools import tee, chain
+from functools import partial
 from re import compile, \
+    error, \
     IGNORECASE, \
     Pattern
 
 from csv_read_write import FileContent, \
+    StreamContent, \
     read_file, \
+    stream_file, \
+    stream_file_bytes, \
+    get_encoding, \
+    can_use_bytes_mode, \
+    read_ahead, \
     print_table
+from csv_columnar import ColumnarContent, \
+    split_columns, \
+    open_table_cache
+from csv_compression import STDIN_NAME, \
+    get_input_files
+from csv_parallel import can_process_in_parallel, \
+    read_raw_header, \
+    read_range, \
+    split_into_ranges, \
+    map_ordered, \
+    process_files
+from csv_schema import resolve_columns
 from csv_utility import get_indexes_by_names, \
-    has_duplicates
+    has_duplicates, \
+    check_quoted_delimiter, \
+    split_rows
 
 
 def check_arguments(args: Namespace) -> None:
@@ -39,6 +62,10 @@ def check_arguments(args: Namespace) -> None:
     if args.c_name and len(args.c_name) != len(args.expression):
         raise ValueError("The number of given expressions should match the"
                          "number of column names.")
+    if args.quoted:
+        check_quoted_delimiter(args.delimiter)
+    if args.jobs < 1:
+        raise ValueError("The number of jobs should be positive.")
 
 
 def match_all_regex(line: str, delimiter: str, expressions: List[Pattern],
@@ -49,7 +76,12 @@ def match_all_regex(line: str, delimiter: str, expressions: List[Pattern],
     '''
     # Note that we have to form string for each column value, otherwise behavior of
     # `^` symbol is undefined according to the documentation
-    data = line.split(delimiter)
+    return match_all_values(line.split(delimiter), line, expressions, indexes)
+
+
+def match_all_values(data: List[AnyStr], line: AnyStr, expressions: List[Pattern],
+                     indexes: List[int]) -> bool:
+    '''Works as match_all_regex for the line which is already split into values'''
     for index, regex in zip(indexes, expressions):
         if index >= len(data):
             raise ValueError(f"There is no {index} column in the row {line}")
@@ -58,15 +90,75 @@ def match_all_regex(line: str, delimiter: str, expressions: List[Pattern],
     return True
 
 
+def filter_rows(rows: Iterable[str], col_indexes: List[int],
+                expressions: List[Pattern], delimiter: str,
+                quoted: bool = False) -> Iterator[str]:
+    '''Lazily yields only those rows, which contain given expressions in the given columns.
+    If quoted is set, rows are split with respect to quoted values.
+    '''
+    if not quoted:
+        return filter(lambda x: match_all_regex(x, delimiter, expressions, col_indexes), rows)
+    rows, copy = tee(rows)
+    return (row for row, data in zip(rows, split_rows(copy, delimiter, quoted))
+            if match_all_values(data, row, expressions, col_indexes))
+
+
+def filter_raw_rows(rows: Iterable[bytes], col_indexes: List[int],
+                    expressions: List[Pattern], raw_expressions: Optional[List[Pattern]],
+                    delimiter: str, encoding: str) -> Iterator[bytes]:
+    '''Lazily yields only those raw rows in the given encoding, which contain given expressions
+    in the given columns. ASCII rows are matched by raw_expressions without decoding.
+    Other rows (or all rows if raw_expressions is None) are decoded and matched by expressions.
+    '''
+    raw_delimiter = delimiter.encode(encoding)
+    for row in rows:
+        if raw_expressions is not None and row.isascii():
+            matched = match_all_regex(row, raw_delimiter, raw_expressions, col_indexes)
+        else:
+            matched = match_all_regex(row.decode(encoding), delimiter, expressions, col_indexes)
+        if matched:
+            yield row
+
+
 def select_rows(file_data: FileContent, col_indexes: List[int],
-                expressions: List[str], delimiter: str) -> FileContent:
+                expressions: List[Pattern], delimiter: str,
+                quoted: bool = False) -> FileContent:
     '''Constructs new FileContent instance by selecting only those content rows, which
     contain given expressions in the given columns.
     '''
     return FileContent(file_data.header,
-                       tuple(line for line in
-                             filter(lambda x: match_all_regex(x, delimiter, expressions, col_indexes),
-                                    file_data.content)))
+                       tuple(filter_rows(file_data.content, col_indexes, expressions,
+                                         delimiter, quoted)))
+
+
+def filter_range(filename: str, col_indexes: List[int], expressions: List[Pattern],
+                 raw_expressions: Optional[List[Pattern]], delimiter: str, quoted: bool,
+                 encoding: str, bytes_mode: bool, byte_range: Tuple[int, int]) -> List[AnyStr]:
+    '''Returns rows from the given byte range of the file, which contain given expressions
+    in the given columns. Rows are returned as raw bytes if bytes_mode is set.
+    The function is executed in the worker process, see map_ordered.
+    '''
+    rows = read_range(filename, *byte_range)
+    if bytes_mode:
+        return list(filter_raw_rows(rows, col_indexes, expressions, raw_expressions,
+                                    delimiter, encoding))
+    return list(filter_rows((row.decode(encoding) for row in rows), col_indexes,
+                            expressions, delimiter, quoted))
+
+
+def select_columnar_rows(table: ColumnarContent, col_indexes: List[int],
+                         expressions: List[Pattern]) -> ColumnarContent:
+    '''Works as select_rows for the columnar table.
+    Every expression is matched only once against each distinct value of its column.
+    '''
+    if table.row_count == 0:
+        return table
+    for index, regex in zip(col_indexes, expressions):
+        if index >= table.column_count:
+            raise ValueError(f"There is no {index} column in the table")
+        table = table.select(index, [regex.search(value) is not None
+                                     for value in table.distinct_values(index)])
+    return table
 
 
 def compile_regex(raw: str, ignore_case: bool) -> Pattern:
@@ -76,19 +168,99 @@ def compile_regex(raw: str, ignore_case: bool) -> Pattern:
     return compile(raw, IGNORECASE) if ignore_case else compile(raw)
 
 
+def compile_raw_regex(raw: str, ignore_case: bool) -> Optional[Pattern]:
+    '''Compiles the given regex into the bytes pattern for matching raw ASCII cells.
+    None is returned if such pattern can match ASCII text differently from the original one.
+    '''
+    # Unicode white spaces include ASCII control symbols, which are not white spaces for bytes patterns
+    if not raw.isascii() or "\\s" in raw or "\\S" in raw:
+        return None
+    try:
+        return compile_regex(raw.encode("ascii"), ignore_case)
+    except error:
+        # Escapes like \u are not allowed in bytes patterns
+        return None
+
+
+def regex_file(args: Namespace, expressions: List[Pattern],
+               raw_expressions: Optional[List[Pattern]], bytes_mode: bool,
+               encoding: str, columns: Dict[str, List[int]], file: str, jobs: int) -> None:
+    '''Filters the content of the given file by regular expressions using jobs processes.
+    columns contains indexes of filtered columns of the files which schema is already known
+    (see resolve_columns), for the rest of files they are found by the header.'''
+    cache = open_table_cache(file, args.delimiter, not args.no_header, args.encoding, args.quoted)
+    if cache is not None:
+        with cache:
+            col_indexes = columns.get(file)
+            if col_indexes is None:
+                col_indexes = get_indexes_by_names(cache.table.header, args.delimiter,
+                                                   args.c_name, args.quoted)
+            print_table(select_columnar_rows(cache.table, col_indexes, expressions).to_stream(),
+                        file, need_to_mark_filename=len(args.files) > 1,
+                        inplace=args.inplace, hide_header=args.hide_header,
+                        encoding=args.encoding)
+        return
+    # Columnar table is built in the memory of a single process
+    parallel = not args.columnar and can_process_in_parallel(file, encoding, jobs)
+    if parallel:
+        raw_header, start = read_raw_header(file, not args.no_header)
+        header = raw_header.decode(encoding) if raw_header is not None else None
+        file_data = StreamContent(raw_header if bytes_mode else header, iter(()))
+    elif args.columnar:
+        file_data = read_file(file, not args.no_header, args.encoding)
+        header = file_data.header
+    elif bytes_mode:
+        file_data = stream_file_bytes(file, not args.no_header)
+        header = (file_data.header.decode(encoding)
+                  if file_data.header is not None else None)
+    else:
+        file_data = stream_file(file, not args.no_header, args.encoding)
+        header = file_data.header
+    col_indexes = columns.get(file)
+    if col_indexes is None:
+        col_indexes = get_indexes_by_names(header, args.delimiter, args.c_name, args.quoted)
+    table = (split_columns(file_data, args.delimiter, quoted=args.quoted)
+             if args.columnar else None)
+    if parallel:
+        worker = partial(filter_range, file, col_indexes, expressions, raw_expressions,
+                         args.delimiter, args.quoted, encoding, bytes_mode)
+        rows = chain.from_iterable(map_ordered(worker, split_into_ranges(file, start, jobs), jobs))
+    elif table is not None:
+        rows = select_columnar_rows(table, col_indexes, expressions).rows()
+    elif bytes_mode:
+        rows = filter_raw_rows(read_ahead(file_data.content), col_indexes, expressions,
+                               raw_expressions, args.delimiter, encoding)
+    else:
+        rows = filter_rows(read_ahead(file_data.content), col_indexes, expressions,
+                           args.delimiter, args.quoted)
+    # Rows are read, filtered and written by different threads unless
+    # worker processes are started during writing
+    print_table(StreamContent(file_data.header, rows),
+                file, need_to_mark_filename=len(args.files) > 1,
+                inplace=args.inplace, hide_header=args.hide_header,
+                encoding=args.encoding, background=not parallel)
+
+
 def callback_regex(args: Namespace) -> None:
     '''Performs filtering table content by regular expressions'''
     check_arguments(args)
     expressions = list(compile_regex(el, args.ignore_case)
                        for el in args.expression)
-    for file in args.files:
-        file_data = read_file(file, not args.no_header)
-        col_indexes = (args.c_index
-                       if args.c_index is not None
-                       else get_indexes_by_names(file_data.header, args.delimiter, args.c_name))
-        file_data = select_rows(file_data, col_indexes,
-                                expressions, args.delimiter)
-        print_table(file_data, file,
-                    need_to_mark_filename=len(args.files) > 1,
-                    inplace=args.inplace,
-                    hide_header=args.hide_header)
+    args.files = get_input_files(args.files)
+    if args.inplace and STDIN_NAME in args.files:
+        raise ValueError("Standard input cannot be modified inplace")
+    encoding = get_encoding(args.encoding)
+    # Columnar table and quoted values are built from the decoded rows
+    bytes_mode = (args.bytes_mode and not args.columnar and not args.quoted
+                  and can_use_bytes_mode(encoding, args.inplace))
+    raw_expressions = None
+    if bytes_mode:
+        raw_expressions = list(compile_raw_regex(el, args.ignore_case)
+                               for el in args.expression)
+        if any(el is None for el in raw_expressions):
+            raw_expressions = None
+    # Unknown column names are reported before any table is read
+    columns = resolve_columns(args.files, args.c_index, args.c_name, not args.no_header,
+                              args.delimiter, args.encoding, args.quoted)
+    process_files(partial(regex_file, args, expressions, raw_expressions, bytes_mode, encoding,
+                          columns), args.files, args.jobs)
@@ -0,0 +1,63 @@
+from typing import Dict, List, NamedTuple, Optional
+
+from csv_read_write import count_columns
+from csv_compression import is_stream_input, \
+    open_text_input
+from csv_utility import get_indexes_by_names, \
+    split_row
+
+
+class TableSchema(NamedTuple):
+    '''Columns of the table known from its header or from its first row'''
+    header: Optional[str]
+    first_row: Optional[str]
+    delimiter: str
+    quoted: bool
+
+    @property
+    def names(self) -> Optional[List[str]]:
+        '''Column names without trailing white spaces or None if the table has no header'''
+        if self.header is None:
+            return None
+        return [el.strip() for el in split_row(self.header, self.delimiter, self.quoted)]
+
+    @property
+    def column_count(self) -> int:
+        return count_columns(self.header, self.first_row, self.delimiter, self.quoted)
+
+    def get_indexes(self, col_names: List[str]) -> List[int]:
+        '''Returns indexes of the given columns in the same way as get_indexes_by_names'''
+        if self.header is None:
+            raise ValueError("Columns cannot be selected by names in the table without header")
+        return get_indexes_by_names(self.header, self.delimiter, col_names, self.quoted)
+
+
+def probe_schema(filename: str, has_header: bool, delimiter: str,
+                 encoding: Optional[str] = None, quoted: bool = False) -> TableSchema:
+    '''Returns the schema of the given table reading only its first line
+    (the first row after the header is not needed if the table has one).
+    '''
+    with open_text_input(filename, encoding) as fin:
+        header = fin.readline().rstrip('\n') if has_header else None
+        first_row = None
+        if header is None:
+            line = fin.readline()
+            first_row = line.rstrip('\n') if line else None
+    return TableSchema(header, first_row, delimiter, quoted)
+
+
+def resolve_columns(files: List[str], col_indexes: Optional[List[int]],
+                    col_names: Optional[List[str]], has_header: bool, delimiter: str,
+                    encoding: Optional[str], quoted: bool) -> Dict[str, List[int]]:
+    '''Returns indexes of the selected columns for each of the given files.
+    Columns selected by names are looked up in the schemas of the tables, so unknown names
+    are reported before any table is read entirely. The standard input and other streams
+    (see is_stream_input) cannot be read twice, so they are not included and their columns
+    should be found once their header is read.
+    '''
+    if col_indexes is not None:
+        return {file: col_indexes for file in files}
+    if col_names is None:
+        return {}
+    return {file: probe_schema(file, has_header, delimiter, encoding, quoted).get_indexes(col_names)
+            for file in files if not is_stream_input(file)}
@@ -1,18 +1,42 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple, Optional, Iterator, Callable, AnyStr
+from functools import partial
+from itertools import chain
+from collections import deque
+import sys
 
-from csv_read_write import FileContent, \
-    read_file,        \
-    convert_to_text,  \
-    print_to_std_out, \
-    get_column_count
+from csv_read_write import StreamContent, \
+    stream_file, \
+    stream_file_bytes, \
+    get_encoding, \
+    can_use_bytes_mode, \
+    read_tail, \
+    peek_first_row, \
+    print_stream_to_std_out, \
+    read_ahead, \
+    count_columns
+from csv_compression import is_seekable_input, \
+    get_input_files
+from csv_index import IndexedTable
+from csv_columnar import open_table_cache
+from csv_schema import resolve_columns
+from csv_parallel import can_process_in_parallel, \
+    read_raw_header, \
+    read_range, \
+    split_into_ranges, \
+    map_ordered, \
+    process_files
 from csv_utility import select_from_row, \
     build_ranges_for_begins_ends, \
     build_ranges_for_singles, \
     cross_ranges, \
     ranges_to_int_sequence, \
+    unite_ranges, \
+    invert_ranges, \
+    select_by_ranges, \
     has_duplicates, \
     invert_indexes, \
-    get_indexes_by_names
+    get_indexes_by_names, \
+    check_quoted_delimiter
 
 
 def check_arguments(args) -> None:
@@ -72,34 +96,35 @@ def check_arguments(args) -> None:
     if has_col_ranges and any(fr > to for fr, to in zip(args.from_col, args.to_col)):
         raise ValueError(
             "End of col range cannot be smaller than the beginning of column range")
+    if args.quoted:
+        check_quoted_delimiter(args.delimiter)
+    if args.jobs < 1:
+        raise ValueError("The number of jobs should be positive")
 
 
-def filter_content(content: Tuple[str], delimiter: str, col_indexes: List[int], row_indexes: List[int]) -> Tuple[str]:
-    '''Returns the filtered content which contains only the chosen row_indexes and col_indexes'''
-    if len(col_indexes) == 0:
-        return tuple()
-    return tuple(select_from_row(content[i], delimiter, col_indexes) for i in row_indexes)
-
-
-def apply_show(file_data: FileContent, row_indexes: List[int], col_indexes: List[int],
-               delimiter: str) -> FileContent:
-    '''Forms new FileContent object which contains only selected column indexes'''
+def stream_show(file_data: StreamContent, col_indexes: List[int],
+                delimiter: str, quoted: bool = False) -> StreamContent:
+    '''Forms new StreamContent object which lazily yields rows from the given
+    one with only selected columns in them'''
     new_header = None
     if file_data.header:
-        new_header = select_from_row(file_data.header, delimiter, col_indexes)
-    return FileContent(new_header,
-                       tuple(filter_content(file_data.content, delimiter, col_indexes, row_indexes)))
+        new_header = select_from_row(file_data.header, delimiter, col_indexes, quoted)
+    if len(col_indexes) == 0:
+        return StreamContent(new_header, iter(()))
+    return StreamContent(new_header,
+                         (select_from_row(row, delimiter, col_indexes, quoted)
+                          for row in file_data.content))
 
 
-def calculate_indexes(full_range: Tuple[int], head: int, tail: int, begins: List[int],
-                      ends: List[int], indexes: List[int]) -> List[int]:
-    '''Calculates the exact indexes which should be displayed from the full_range based on all
-    input ranges nad particular indexes.
-    Function guarantees that the return list will contain only unique values from within full_range
-    and they will be sorted.
+def calculate_ranges(full_range: Tuple[int], head: int, tail: int, begins: List[int],
+                     ends: List[int], indexes: List[int]) -> List[Tuple[int]]:
+    '''Calculates ranges of indexes which should be displayed from the full_range based on all
+    input ranges and particular indexes.
+    Function guarantees that the returned ranges lie within full_range, do not intersect
+    and are sorted.
     '''
     if head is None and tail is None and begins is None and ends is None and indexes is None:
-        return ranges_to_int_sequence([full_range])
+        return unite_ranges([full_range])
     res = []
     if head is not None:
         res.append(cross_ranges(full_range, (full_range[0], head)))
@@ -113,11 +138,22 @@ def calculate_indexes(full_range: Tuple[int], head: int, tail: int, begins: List
         res.extend([cross_ranges(full_range, el)
                    for el in build_ranges_for_singles(indexes)])
     res.sort()
-    return ranges_to_int_sequence(res)
+    return unite_ranges(res)
+
+
+def calculate_indexes(full_range: Tuple[int], head: int, tail: int, begins: List[int],
+                      ends: List[int], indexes: List[int]) -> List[int]:
+    '''Calculates the exact indexes which should be displayed from the full_range based on all
+    input ranges nad particular indexes.
+    Function guarantees that the return list will contain only unique values from within full_range
+    and they will be sorted.
+    '''
+    return ranges_to_int_sequence(calculate_ranges(full_range, head, tail, begins, ends, indexes))
 
 
 def merge_named_and_pure_column_indexes(pure: List[int], named: List[str],
-                                        header: str, delimiter: str) -> List[int]:
+                                        header: str, delimiter: str,
+                                        quoted: bool = False) -> List[int]:
     '''Function takes as an input two lists which define particular columns in the table.
        The first list contains columns indexes, the second - columns names.
        Function converts name list into the one with indexes and merges
@@ -130,28 +166,214 @@ def merge_named_and_pure_column_indexes(pure: List[int], named: List[str],
     if pure is not None:
         res.extend(pure)
     if named is not None:
-        res.extend(get_indexes_by_names(header, delimiter, named))
+        res.extend(get_indexes_by_names(header, delimiter, named, quoted))
     return res
 
 
+def get_row_limit(args) -> Optional[int]:
+    '''Returns the number of the first table rows which contain all selected rows
+    or None if it cannot be known before the whole table is read'''
+    if args.r_tail is not None or args.except_flag:
+        return None
+    if args.r_head is None and args.from_row is None and args.r_index is None:
+        return None
+    ranges = calculate_ranges((0, sys.maxsize), args.r_head, None,
+                              args.from_row, args.to_row, args.r_index)
+    return ranges[-1][1] if ranges else 0
+
+
+def is_tail_only(args) -> bool:
+    '''Returns True if only the last rows of the table are requested'''
+    return (args.r_tail is not None and args.r_head is None and args.from_row is None
+            and args.r_index is None and not args.except_flag)
+
+
+def get_delimiter(args, raw_encoding: Optional[str]) -> AnyStr:
+    '''Returns the delimiter, which is raw bytes in raw_encoding if it is set'''
+    return args.delimiter.encode(raw_encoding) if raw_encoding is not None else args.delimiter
+
+
+def get_column_indexes(args, header: Optional[AnyStr], first_row: Optional[AnyStr],
+                       raw_encoding: Optional[str] = None,
+                       named_indexes: Optional[List[int]] = None) -> List[int]:
+    '''Calculates indexes of columns selected by user.
+    If raw_encoding is set, header and first_row are raw bytes in this encoding.
+    named_indexes are indexes of columns selected by names if they are already known
+    (see resolve_columns), otherwise they are found by the header.
+    '''
+    text_header = header
+    if raw_encoding is not None:
+        text_header = header.decode(raw_encoding) if header is not None else None
+    column_count = count_columns(header, first_row, get_delimiter(args, raw_encoding),
+                                 args.quoted)
+    if named_indexes is None:
+        separate_col_indexes = merge_named_and_pure_column_indexes(
+            args.c_index, args.c_name, text_header, args.delimiter, args.quoted)
+    else:
+        separate_col_indexes = (args.c_index or []) + named_indexes
+    col_indexes = calculate_indexes((0, column_count), args.c_head, args.c_tail,
+                                    args.from_col, args.to_col, separate_col_indexes)
+    if args.except_flag:
+        col_indexes = invert_indexes(col_indexes, column_count)
+    return col_indexes
+
+
+def show_rows(args, filename: str, header: Optional[AnyStr], first_row: Optional[AnyStr],
+              row_count: int, read_rows: Callable[[List[Tuple[int]]], Iterator[AnyStr]],
+              raw_encoding: Optional[str] = None,
+              named_indexes: Optional[List[int]] = None) -> None:
+    '''Calculates the selection requested by user and prints it.
+    read_rows should lazily yield the table rows which indexes are covered
+    by the given ranges. If the row count is unknown it should be set to sys.maxsize.
+    If raw_encoding is set, header and rows are raw bytes in this encoding.
+    named_indexes are passed to get_column_indexes.
+    '''
+    delimiter = get_delimiter(args, raw_encoding)
+    col_indexes = get_column_indexes(args, header, first_row, raw_encoding, named_indexes)
+    row_ranges = calculate_ranges((0, row_count), args.r_head, args.r_tail,
+                                  args.from_row, args.to_row, args.r_index)
+    if args.except_flag:
+        row_ranges = invert_ranges(row_ranges, (0, row_count))
+    print_stream_to_std_out(stream_show(StreamContent(header, read_rows(row_ranges)),
+                                        col_indexes, delimiter, args.quoted),
+                            filename, need_to_mark_filename=len(args.files) > 1,
+                            hide_header=args.hide_header, background=True)
+
+
+def show_stream(args, filename: str, raw_encoding: Optional[str],
+                named_indexes: Optional[List[int]] = None) -> None:
+    '''Performs the selection reading the file sequentially from its beginning.
+    Rows are loaded into memory only if it is required by the selection.
+    If raw_encoding is set, rows are processed as raw bytes in this encoding.
+    '''
+    if raw_encoding is not None:
+        file_data = stream_file_bytes(filename, not args.no_header)
+    else:
+        file_data = stream_file(filename, not args.no_header, args.encoding)
+    show = partial(show_rows, args, filename, file_data.header, raw_encoding=raw_encoding,
+                   named_indexes=named_indexes)
+    # Rows are read in background unless only a few first rows are needed
+    content = (file_data.content if get_row_limit(args) is not None
+               else read_ahead(file_data.content))
+    try:
+        first_row, rows = peek_first_row(content)
+        if is_tail_only(args):
+            buffered = tuple(deque(rows, maxlen=args.r_tail))
+            show(first_row, len(buffered), partial(select_by_ranges, buffered))
+        elif args.r_tail is not None:
+            buffered = tuple(rows)
+            show(first_row, len(buffered), partial(select_by_ranges, buffered))
+        else:
+            # Reading stops as soon as the last selected row is displayed
+            show(first_row, sys.maxsize, partial(select_by_ranges, rows))
+    finally:
+        content.close()
+
+
+def selects_all_rows(args) -> bool:
+    '''Returns True if all table rows are displayed'''
+    return (args.r_head is None and args.r_tail is None and args.from_row is None
+            and args.r_index is None and not args.except_flag)
+
+
+def select_range(filename: str, col_indexes: List[int], delimiter: str, quoted: bool,
+                 encoding: str, raw: bool, byte_range: Tuple[int, int]) -> List[AnyStr]:
+    '''Returns rows from the given byte range of the file with only selected columns in them.
+    Rows are returned as raw bytes if raw is set.
+    The function is executed in the worker process, see map_ordered.
+    '''
+    rows = read_range(filename, *byte_range)
+    if raw:
+        delimiter = delimiter.encode(encoding)
+    else:
+        rows = (row.decode(encoding) for row in rows)
+    return [select_from_row(row, delimiter, col_indexes, quoted) for row in rows]
+
+
+def show_in_parallel(args, filename: str, jobs: int, encoding: str,
+                     raw_encoding: Optional[str],
+                     named_indexes: Optional[List[int]] = None) -> None:
+    '''Displays all table rows selecting columns in them by jobs processes.
+    The file is cut into byte ranges, which are processed independently,
+    and rows are printed in the original order.
+    If raw_encoding is set, rows are processed as raw bytes in this encoding.
+    '''
+    header, start = read_raw_header(filename, not args.no_header)
+    first_row = next(read_range(filename, start, sys.maxsize), None)
+    if raw_encoding is None:
+        header = header.decode(encoding) if header is not None else None
+        first_row = first_row.decode(encoding) if first_row is not None else None
+    col_indexes = get_column_indexes(args, header, first_row, raw_encoding, named_indexes)
+    content = stream_show(StreamContent(header, iter(())), col_indexes,
+                          get_delimiter(args, raw_encoding), args.quoted)
+    if col_indexes:
+        worker = partial(select_range, filename, col_indexes, args.delimiter, args.quoted,
+                         encoding, raw_encoding is not None)
+        rows = map_ordered(worker, split_into_ranges(filename, start, jobs), jobs)
+        content = StreamContent(content.header, chain.from_iterable(rows))
+    print_stream_to_std_out(content, filename, need_to_mark_filename=len(args.files) > 1,
+                            hide_header=args.hide_header)
+
+
+def show_file(args, encoding: str, raw_encoding: Optional[str], columns: Dict[str, List[int]],
+              file: str, jobs: int) -> None:
+    '''Performs the selection from the given file using jobs processes.
+    If raw_encoding is set, rows are processed as raw bytes in this encoding.
+    columns contains indexes of columns selected by names of the files which schema
+    is already known (see resolve_columns), for the rest of files they are found by the header.
+    '''
+    named_indexes = columns.get(file)
+    cache = open_table_cache(file, args.delimiter, not args.no_header, args.encoding, args.quoted)
+    if cache is not None:
+        with cache:
+            table = cache.table
+            show_rows(args, file, table.header, next(table.rows_in_ranges([(0, 1)]), None),
+                      table.row_count, table.rows_in_ranges, named_indexes=named_indexes)
+        return
+    if selects_all_rows(args) and can_process_in_parallel(file, encoding, jobs):
+        show_in_parallel(args, file, jobs, encoding, raw_encoding, named_indexes)
+        return
+    if not is_seekable_input(file):
+        # Standard input and compressed files can be read only sequentially
+        show_stream(args, file, raw_encoding, named_indexes)
+        return
+    if is_tail_only(args) and not args.use_index:
+        file_data = read_tail(file, not args.no_header, args.r_tail, encoding=args.encoding)
+        # Without header the column count is defined by the first row of the table
+        first_row = (next(stream_file(file, False, args.encoding).content, None)
+                     if file_data.header is None else None)
+        show_rows(args, file, file_data.header, first_row, len(file_data.content),
+                  partial(select_by_ranges, file_data.content), named_indexes=named_indexes)
+        return
+    indexed_table = partial(IndexedTable, file, not args.no_header, encoding=args.encoding,
+                            binary=raw_encoding is not None)
+    if args.use_index or args.r_tail is not None:
+        with indexed_table(use_sidecar=args.use_index) as table:
+            show_rows(args, file, table.header, table.row(0),
+                      table.row_count, table.rows, raw_encoding, named_indexes)
+        return
+    row_limit = get_row_limit(args)
+    if row_limit is not None and (args.from_row is not None or args.r_index is not None):
+        # Only the part of the table which contains selected rows is indexed
+        with indexed_table(row_limit=row_limit) as table:
+            show_rows(args, file, table.header, table.row(0),
+                      sys.maxsize, table.rows, raw_encoding, named_indexes)
+        return
+    # The rest of selections can be done in a single pass without knowing the table size
+    show_stream(args, file, raw_encoding, named_indexes)
+
+
 def callback_show(args):
     '''Performs columns selection from file according the the given arguments'''
     check_arguments(args)
-    for file in args.files:
-        file_data = read_file(file, not args.no_header)
-        column_count = get_column_count(file_data, args.delimiter)
-        row_count = len(file_data.content)
-        separate_col_indexes = merge_named_and_pure_column_indexes(
-            args.c_index, args.c_name, file_data.header, args.delimiter)
-
-        col_indexes = calculate_indexes((0, column_count), args.c_head, args.c_tail,
-                                        args.from_col, args.to_col, separate_col_indexes)
-        row_indexes = calculate_indexes((0, row_count), args.r_head, args.r_tail,
-                                        args.from_row, args.to_row, args.r_index)
-        if args.except_flag:
-            col_indexes = invert_indexes(col_indexes, column_count)
-            row_indexes = invert_indexes(row_indexes, row_count)
-        file_data = apply_show(file_data, row_indexes,
-                               col_indexes, args.delimiter)
-        print_to_std_out(convert_to_text(file_data, args.hide_header), file,
-                         need_to_mark_filename=len(args.files) > 1)
+    args.files = get_input_files(args.files)
+    # Unknown column names are reported before any table is read
+    columns = resolve_columns(args.files, None, args.c_name, not args.no_header,
+                              args.delimiter, args.encoding, args.quoted)
+    encoding = get_encoding(args.encoding)
+    # Quoted values are parsed only in the decoded rows
+    raw_encoding = (encoding if args.bytes_mode and not args.quoted
+                    and can_use_bytes_mode(encoding, inplace=False)
+                    else None)
+    process_files(partial(show_file, args, encoding, raw_encoding, columns),
+                  args.files, args.jobs)
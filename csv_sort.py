@@ -1,13 +1,50 @@
-from typing import List, Tuple, Any
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Any, Sequence, Iterable, Iterator, TextIO
 from enum import Enum
-import datetime
+from functools import partial, lru_cache
+from itertools import chain, islice
+from operator import itemgetter
+import heapq
 import math
+import sys
 
 from csv_read_write import FileContent, \
+    StreamContent, \
     read_file, \
+    stream_file, \
+    get_encoding, \
     print_table
+from csv_columnar import ColumnarContent, \
+    TableCache, \
+    split_columns, \
+    open_table_cache
+from csv_compression import STDIN_NAME, \
+    get_input_files
+from csv_external import sort_externally
+from csv_keys import encode_number, \
+    encode_integer, \
+    encode_string
+from csv_defaults import DEFAULT_CONVERSION_CACHE_SIZE, \
+    DEFAULT_PARALLEL_CHUNK_SIZE, \
+    DEFAULT_PARALLEL_CHUNK_ROWS, \
+    DEFAULT_PIPELINE_BATCH_SIZE
+from csv_parallel import can_process_in_parallel, \
+    read_raw_header, \
+    read_range, \
+    split_into_ranges, \
+    split_into_chunks, \
+    map_ordered, \
+    process_files
+from csv_schema import resolve_columns
+from csv_time import compile_time_parser
+from csv_numpy import is_numpy_available, \
+    number_array, \
+    key_array, \
+    rank_array, \
+    stable_order
 from csv_utility import get_indexes_by_names, \
-    has_duplicates
+    has_duplicates, \
+    check_quoted_delimiter, \
+    split_rows
 
 
 class ColumnType(Enum):
@@ -16,19 +53,48 @@ class ColumnType(Enum):
     TIME = "time"
 
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+
+
 class RowSorter:
     '''Defines the comparator for sorting rows in the file according to the
-    arguments passed by user.'''
+    arguments passed by user.
+    Time values are converted into integer keys (see compile_time_parser).
+    Converted number and time values are kept in per column caches, which keep
+    at most cache_size of the recently used values (0 disables caching).
+    If binary_keys is set, the comparator encodes values of the row into
+    the single bytes value with the same order (see csv_keys), so rows are
+    compared at once instead of comparing tuples value by value.'''
 
     def __init__(self, col_indexes: List[int], col_types: List[str],
-                 delimiter: str, time_fmt: str) -> None:
+                 delimiter: str, time_fmt: str,
+                 cache_size: int = DEFAULT_CONVERSION_CACHE_SIZE,
+                 binary_keys: bool = False) -> None:
         self.col_indexes = col_indexes
         self.col_types = [ColumnType(ct) for ct in col_types]
         self.delimiter = delimiter
         self.time_fmt = time_fmt
+        self.binary_keys = binary_keys
+        self._parse_time = compile_time_parser(time_fmt)
+        self._converters = [self._make_converter(v_type, cache_size)
+                            for v_type in self.col_types]
 
-    def _convert_value(self, value: str, v_type: ColumnType) -> Any:
+    def _make_converter(self, v_type: ColumnType, cache_size: int):
+        convert = self._encode_value if self.binary_keys else self.convert_value
+        converter = partial(convert, v_type=v_type)
+        if v_type is ColumnType.STRING or cache_size == 0:
+            return converter
+        return lru_cache(maxsize=cache_size)(converter)
+
+    def convert_value(self, value: str, v_type: ColumnType) -> Any:
+        '''Converts the value into the comparator value of the given type
+        without caching it. Values which cannot be converted go after the rest.'''
         if v_type is ColumnType.NUMBER:
+            # Empty values are common and cannot be converted
+            if not value:
+                return math.inf
             try:
                 res = float(value)
             except:
@@ -37,33 +103,289 @@ class RowSorter:
         elif v_type is ColumnType.STRING:
             return value
         elif v_type is ColumnType.TIME:
-            try:
-                res = datetime.datetime.strptime(value, self.time_fmt)
-            except:
-                res = datetime.datetime.max
-            return res
+            return self._parse_time(value)
+        else:
+            raise NotImplementedError
+
+    def _encode_value(self, value: str, v_type: ColumnType) -> bytes:
+        if v_type is ColumnType.NUMBER:
+            return encode_number(self.convert_value(value, v_type))
+        elif v_type is ColumnType.STRING:
+            return encode_string(value)
+        elif v_type is ColumnType.TIME:
+            return encode_integer(self._parse_time(value))
         else:
             raise NotImplementedError
 
     def _value_iterator(self, splitted_row: List[str]):
-        for i, row_idx in enumerate(self.col_indexes):
-            yield self._convert_value(splitted_row[row_idx].strip(),
-                                      self.col_types[i])
+        for converter, row_idx in zip(self._converters, self.col_indexes):
+            yield converter(splitted_row[row_idx].strip())
+
+    @property
+    def converters(self) -> List[Callable[[str], Any]]:
+        '''Functions which convert values of sort columns in the same way as
+        the comparator does it, number and time values are cached.'''
+        return self._converters
+
+    def cache_info(self) -> List[Optional[CacheInfo]]:
+        '''Returns the numbers of cache hits and misses of every sort column
+        or None for columns which values are not converted.'''
+        res = []
+        for converter in self._converters:
+            info = converter.cache_info() if hasattr(converter, "cache_info") else None
+            res.append(CacheInfo(info.hits, info.misses) if info is not None else None)
+        return res
+
+    def make_key(self, splitted_row: List[str]) -> Any:
+        '''Returns the comparator value of the already split row'''
+        if self.binary_keys:
+            return b"".join(self._value_iterator(splitted_row))
+        return tuple(self._value_iterator(splitted_row))
 
-    def comparator(self, row: str) -> Tuple[Any]:
-        splitted_row = row.split(self.delimiter)
-        return tuple(el for el in self._value_iterator(splitted_row))
+    def comparator(self, row: str) -> Any:
+        return self.make_key(row.split(self.delimiter))
+
+
+class ConversionStats:
+    '''Sums numbers of conversion cache hits and misses of sort columns
+    over all sorters which converted values of the table.
+    If values are converted without conversion caches, the reason is kept instead.'''
+
+    def __init__(self) -> None:
+        self.cache_info: List[Optional[CacheInfo]] = []
+        self.unavailable_reason: Optional[str] = None
+
+    def mark_unavailable(self, reason: str) -> None:
+        '''Notes that values are not converted by conversion caches for the given reason'''
+        self.unavailable_reason = reason
+
+    def add(self, cache_info: List[Optional[CacheInfo]]) -> None:
+        if not self.cache_info:
+            self.cache_info = list(cache_info)
+            return
+        self.cache_info = [CacheInfo(lhs.hits + rhs.hits, lhs.misses + rhs.misses)
+                           if lhs is not None else None
+                           for lhs, rhs in zip(self.cache_info, cache_info)]
+
+    def report(self, filename: str, col_indexes: List[int], out: TextIO = None) -> None:
+        '''Prints statistics of columns which values were converted'''
+        out = out if out is not None else sys.stderr
+        if self.unavailable_reason is not None:
+            out.write(f"{filename}: conversion cache statistics are not available: "
+                      f"{self.unavailable_reason}\n")
+            return
+        for index, info in zip(col_indexes, self.cache_info):
+            if info is not None:
+                out.write(f"{filename}: conversion cache of column {index}: "
+                          f"{info.hits} hits, {info.misses} misses\n")
+
+
+class SortedChunk(NamedTuple):
+    '''Sorted rows together with their comparator values and
+    statistics of the sorter which converted them'''
+    pairs: List[Tuple[Tuple[Any], str]]
+    cache_info: List[Optional[CacheInfo]]
 
 
 def sort_content(file_data: FileContent, col_indexes: List[int],
                  col_types: List[str], delimiter: str, rev_order: bool,
-                 time_fmt: str) -> FileContent:
+                 time_fmt: str, quoted: bool = False,
+                 stats: Optional[ConversionStats] = None,
+                 binary_keys: bool = False) -> FileContent:
     '''Sorts the content field in the FileContent object according to the
-    settings'''
+    settings. If quoted is set, rows are split with respect to quoted values.
+    If stats is set, statistics of conversion caches are added to it.
+    If binary_keys is set, rows are compared by encoded keys (see RowSorter).'''
+    sorter = RowSorter(col_indexes, col_types, delimiter, time_fmt, binary_keys=binary_keys)
+    if not quoted:
+        res = tuple(sorted(file_data.content, key=sorter.comparator, reverse=rev_order))
+    else:
+        keys = get_sort_keys(file_data.content, sorter, quoted)
+        order = sorted(range(len(keys)), key=keys.__getitem__, reverse=rev_order)
+        res = tuple(file_data.content[i] for i in order)
+    if stats is not None:
+        stats.add(sorter.cache_info())
+    return FileContent(file_data.header, res)
+
+
+def sort_content_numpy(file_data: FileContent, col_indexes: List[int],
+                       col_types: List[str], delimiter: str, rev_order: bool,
+                       time_fmt: str, quoted: bool = False,
+                       stats: Optional[ConversionStats] = None) -> FileContent:
+    '''Works as sort_content, but values of sort columns are converted into NumPy arrays
+    (numbers as float64, time keys as int64 and strings as their ranks) and
+    the order of rows is found by the stable NumPy sort. NumPy should be available.'''
     sorter = RowSorter(col_indexes, col_types, delimiter, time_fmt)
-    return FileContent(file_data.header, tuple(sorted(file_data.content,
-                                                      key=sorter.comparator,
-                                                      reverse=rev_order)))
+    count = len(file_data.content)
+    if count == 0:
+        return file_data
+    cells = [[splitted_row[index].strip() for index in sorter.col_indexes]
+             for splitted_row in split_rows(file_data.content, delimiter, quoted)]
+    columns = []
+    for values, converter, v_type in zip(zip(*cells), sorter.converters, sorter.col_types):
+        if v_type is ColumnType.NUMBER:
+            columns.append(number_array(values, converter))
+        elif v_type is ColumnType.TIME:
+            columns.append(key_array(map(converter, values), count))
+        else:
+            columns.append(rank_array(values))
+    if stats is not None:
+        # Most of values are converted by NumPy at once, so the caches do not see them
+        stats.mark_unavailable("values are converted by NumPy")
+    order = stable_order(columns, rev_order)
+    return FileContent(file_data.header, tuple(map(file_data.content.__getitem__, order)))
+
+
+def get_sort_keys(rows: Sequence[str], sorter: RowSorter, quoted: bool) -> List[Tuple[Any]]:
+    '''Returns the list of sorter comparator values for the given rows.
+    If quoted is set, rows are split with respect to quoted values.'''
+    if not quoted:
+        return list(map(sorter.comparator, rows))
+    return [sorter.make_key(splitted_row)
+            for splitted_row in split_rows(rows, sorter.delimiter, quoted)]
+
+
+def sort_rows(col_indexes: List[int], col_types: List[str], delimiter: str,
+              rev_order: bool, time_fmt: str, quoted: bool,
+              rows: Sequence[str], binary_keys: bool = False) -> SortedChunk:
+    '''Sorts the given rows and returns them together with their comparator values,
+    so sorted chunks can be merged without converting values again.
+    The function is executed in the worker process, see map_ordered.'''
+    sorter = RowSorter(col_indexes, col_types, delimiter, time_fmt, binary_keys=binary_keys)
+    pairs = sorted(zip(get_sort_keys(rows, sorter, quoted), rows),
+                   key=itemgetter(0), reverse=rev_order)
+    return SortedChunk(pairs, sorter.cache_info())
+
+
+def sort_range(filename: str, col_indexes: List[int], col_types: List[str],
+               delimiter: str, rev_order: bool, time_fmt: str, quoted: bool,
+               encoding: str, byte_range: Tuple[int, int],
+               binary_keys: bool = False) -> SortedChunk:
+    '''Sorts rows from the given byte range of the file in the same way as sort_rows.
+    The function is executed in the worker process, see map_ordered.'''
+    rows = [row.decode(encoding) for row in read_range(filename, *byte_range)]
+    return sort_rows(col_indexes, col_types, delimiter, rev_order, time_fmt, quoted, rows,
+                     binary_keys)
+
+
+def merge_sorted(sorted_chunks: Iterable[SortedChunk], rev_order: bool,
+                 stats: Optional[ConversionStats] = None) -> Iterator[str]:
+    '''Lazily yields rows of the sorted consecutive chunks in the same order as if the whole
+    table was sorted at once. Rows with equal keys are taken from the earlier chunk first,
+    so the merge is stable, as the sorting itself.
+    All chunks are needed to start the merge, so they are received at once
+    and their statistics are added to stats (if it is set).'''
+    sorted_chunks = list(sorted_chunks)
+    if stats is not None:
+        for chunk in sorted_chunks:
+            stats.add(chunk.cache_info)
+    return map(itemgetter(1), heapq.merge(*(chunk.pairs for chunk in sorted_chunks),
+                                          key=itemgetter(0), reverse=rev_order))
+
+
+def sort_in_parallel(filename: str, start: int, jobs: int, col_indexes: List[int],
+                     col_types: List[str], delimiter: str, rev_order: bool,
+                     time_fmt: str, quoted: bool, encoding: str,
+                     chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE,
+                     stats: Optional[ConversionStats] = None,
+                     binary_keys: bool = False) -> Iterator[str]:
+    '''Lazily yields rows of the file starting from the start offset in the same order
+    as sort_content does. Byte ranges of the file are read and sorted by jobs processes
+    and the results are merged.'''
+    worker = partial(sort_range, filename, col_indexes, col_types, delimiter,
+                     rev_order, time_fmt, quoted, encoding, binary_keys=binary_keys)
+    ranges = split_into_ranges(filename, start, jobs, chunk_size)
+    return merge_sorted(map_ordered(worker, ranges, jobs), rev_order, stats)
+
+
+def sort_content_in_parallel(file_data: FileContent, jobs: int, col_indexes: List[int],
+                             col_types: List[str], delimiter: str, rev_order: bool,
+                             time_fmt: str, quoted: bool,
+                             chunk_size: int = DEFAULT_PARALLEL_CHUNK_ROWS,
+                             stats: Optional[ConversionStats] = None,
+                             binary_keys: bool = False) -> StreamContent:
+    '''Sorts the content in the same way as sort_content does, but chunks of rows
+    are sent to jobs processes, which convert their values and sort them.
+    It is used for tables which cannot be cut into byte ranges (see sort_in_parallel).'''
+    worker = partial(sort_rows, col_indexes, col_types, delimiter, rev_order, time_fmt, quoted,
+                     binary_keys=binary_keys)
+    chunks = split_into_chunks(file_data.content, jobs, chunk_size)
+    return StreamContent(file_data.header,
+                         merge_sorted(map_ordered(worker, chunks, jobs), rev_order, stats))
+
+
+def sort_top(rows: Iterable[str], sorter: RowSorter, rev_order: bool, limit: int,
+             quoted: bool = False,
+             batch_size: int = DEFAULT_PIPELINE_BATCH_SIZE) -> List[Tuple[Tuple[Any], str]]:
+    '''Returns the first limit rows of the sorted rows (in the same order as sort_content
+    returns them) together with their comparator values. Rows are consumed lazily by
+    batches and only the best limit rows are kept in the heap, so ties keep their order.'''
+    rows = iter(rows)
+    pairs = chain.from_iterable(zip(get_sort_keys(batch, sorter, quoted), batch)
+                                for batch in iter(lambda: list(islice(rows, batch_size)), []))
+    select = heapq.nlargest if rev_order else heapq.nsmallest
+    return select(limit, pairs, key=itemgetter(0))
+
+
+def top_range(filename: str, col_indexes: List[int], col_types: List[str],
+              delimiter: str, rev_order: bool, time_fmt: str, quoted: bool,
+              encoding: str, limit: int, byte_range: Tuple[int, int],
+              binary_keys: bool = False) -> SortedChunk:
+    '''Selects the first limit sorted rows from the given byte range of the file
+    (see sort_top). The function is executed in the worker process, see map_ordered.'''
+    rows = (row.decode(encoding) for row in read_range(filename, *byte_range))
+    sorter = RowSorter(col_indexes, col_types, delimiter, time_fmt, binary_keys=binary_keys)
+    return SortedChunk(sort_top(rows, sorter, rev_order, limit, quoted), sorter.cache_info())
+
+
+def top_in_parallel(filename: str, start: int, jobs: int, col_indexes: List[int],
+                    col_types: List[str], delimiter: str, rev_order: bool,
+                    time_fmt: str, quoted: bool, encoding: str, limit: int,
+                    chunk_size: int = DEFAULT_PARALLEL_CHUNK_SIZE,
+                    stats: Optional[ConversionStats] = None,
+                    binary_keys: bool = False) -> Iterator[str]:
+    '''Works as sort_in_parallel, but only the first limit sorted rows are yielded.
+    Each worker keeps only the best limit rows of its byte range.'''
+    worker = partial(top_range, filename, col_indexes, col_types, delimiter,
+                     rev_order, time_fmt, quoted, encoding, limit, binary_keys=binary_keys)
+    ranges = split_into_ranges(filename, start, jobs, chunk_size)
+    return islice(merge_sorted(map_ordered(worker, ranges, jobs), rev_order, stats), limit)
+
+
+def sort_columnar(table: ColumnarContent, col_indexes: List[int],
+                  col_types: List[str], rev_order: bool, time_fmt: str) -> ColumnarContent:
+    '''Sorts rows of the columnar table in the same way as sort_content does.
+    Every distinct cell value is converted only once.'''
+    if table.row_count == 0:
+        return table
+    sorter = RowSorter(col_indexes, col_types, table.delimiter, time_fmt)
+    keys = [(index, [sorter.convert_value(value.strip(), v_type)
+                     for value in table.distinct_values(index)])
+            for index, v_type in zip(sorter.col_indexes, sorter.col_types)]
+    return table.sort(keys, rev_order)
+
+
+def sort_cached(cache: TableCache, col_indexes: List[int], col_types: List[str],
+                rev_order: bool, time_fmt: str) -> ColumnarContent:
+    '''Sorts rows of the cached table in the same way as sort_content does.
+    Number keys and time keys (if they were cached with the same format) are taken
+    from the cache, so values are not converted at all.'''
+    table = cache.table
+    if table.row_count == 0:
+        return table
+    sorter = RowSorter(col_indexes, col_types, table.delimiter, time_fmt)
+    keys = []
+    for index, v_type in zip(sorter.col_indexes, sorter.col_types):
+        value_keys = None
+        if v_type is ColumnType.NUMBER:
+            value_keys = cache.number_keys(index)
+        elif v_type is ColumnType.TIME:
+            value_keys = cache.time_keys(index, time_fmt)
+        if value_keys is None:
+            value_keys = [sorter.convert_value(value.strip(), v_type)
+                          for value in table.distinct_values(index)]
+        keys.append((index, list(value_keys)))
+    return table.sort(keys, rev_order)
 
 
 def check_arguments(args) -> None:
@@ -92,20 +414,122 @@ def check_arguments(args) -> None:
     if args.c_index is not None and has_duplicates(args.c_index):
         raise ValueError(
             "Duplicate indexes in 'c_index' argument are not allowed.")
+    if args.quoted:
+        check_quoted_delimiter(args.delimiter)
+    if args.jobs < 1:
+        raise ValueError("The number of jobs should be positive.")
+    if args.limit is not None and args.limit < 0:
+        raise ValueError("The number of sorted rows to display should not be negative.")
+    if args.limit is not None and args.inplace:
+        raise ValueError("Only the first sorted rows are displayed with the limit, "
+                         "so the table cannot be modified inplace.")
+    if args.max_memory is not None and args.columnar:
+        raise ValueError("Columnar table is kept in memory entirely, "
+                         "so it cannot be sorted with the memory limit.")
+
+
+def sort_file(args, encoding: str, columns: Dict[str, List[int]], file: str, jobs: int) -> None:
+    '''Sorts the content of the given file using jobs processes.
+    columns contains indexes of sorting columns of the files which schema is already known
+    (see resolve_columns), for the rest of files they are found by the header.'''
+    cache = open_table_cache(file, args.delimiter, not args.no_header, args.encoding, args.quoted)
+    if cache is not None:
+        with cache:
+            col_index = columns.get(file)
+            if col_index is None:
+                col_index = get_indexes_by_names(cache.table.header, args.delimiter,
+                                                 args.c_name, args.quoted)
+            file_data = sort_cached(cache, col_index, args.c_type, args.reverse,
+                                    args.time_fmt).to_stream()
+            if args.limit is not None:
+                file_data = StreamContent(file_data.header, islice(file_data.content, args.limit))
+            print_table(file_data, file,
+                        need_to_mark_filename=len(args.files) > 1,
+                        inplace=args.inplace,
+                        hide_header=args.hide_header,
+                        encoding=args.encoding)
+        if args.cache_stats:
+            stats = ConversionStats()
+            stats.mark_unavailable("keys are taken from the table cache")
+            stats.report(file, col_index)
+        return
+    # Columnar table is built in the memory of a single process and
+    # the memory limit is kept by a single process as well.
+    # Only the best rows are kept in memory if the number of rows is limited
+    top = args.limit is not None
+    external = not top and args.max_memory is not None
+    parallel = not args.columnar and not external and can_process_in_parallel(file, encoding, jobs)
+    if parallel:
+        raw_header, start = read_raw_header(file, not args.no_header)
+        header = raw_header.decode(encoding) if raw_header is not None else None
+    elif top or external:
+        file_data = stream_file(file, not args.no_header, args.encoding)
+        header = file_data.header
+    else:
+        file_data = read_file(file, not args.no_header, args.encoding)
+        header = file_data.header
+    col_index = columns.get(file)
+    if col_index is None:
+        col_index = get_indexes_by_names(header, args.delimiter, args.c_name, args.quoted)
+    table = (split_columns(file_data, args.delimiter, quoted=args.quoted)
+             if args.columnar and not top else None)
+    # Values are converted either by the sorter of this process or by sorters of workers
+    stats = ConversionStats()
+    sorter = RowSorter(col_index, args.c_type, args.delimiter, args.time_fmt,
+                       binary_keys=args.binary_keys)
+    if parallel and top:
+        file_data = StreamContent(header, top_in_parallel(
+            file, start, jobs, col_index, args.c_type, args.delimiter,
+            args.reverse, args.time_fmt, args.quoted, encoding, args.limit, stats=stats,
+            binary_keys=args.binary_keys))
+    elif parallel:
+        file_data = StreamContent(header, sort_in_parallel(
+            file, start, jobs, col_index, args.c_type, args.delimiter,
+            args.reverse, args.time_fmt, args.quoted, encoding, stats=stats,
+            binary_keys=args.binary_keys))
+    elif top:
+        file_data = StreamContent(header, map(itemgetter(1), sort_top(
+            file_data.content, sorter, args.reverse, args.limit, args.quoted)))
+    elif external:
+        file_data = StreamContent(header, sort_externally(
+            file_data.content, partial(get_sort_keys, sorter=sorter, quoted=args.quoted),
+            args.reverse, args.max_memory, args.tmp_dir))
+    elif table is not None:
+        stats.mark_unavailable("every distinct value of the columnar table is converted once")
+        file_data = sort_columnar(table, col_index, args.c_type,
+                                  args.reverse, args.time_fmt).to_stream()
+    elif jobs > 1:
+        # The table is already read, so no reading thread is running while workers are started
+        file_data = sort_content_in_parallel(file_data, jobs, col_index, args.c_type,
+                                             args.delimiter, args.reverse, args.time_fmt,
+                                             args.quoted, stats=stats,
+                                             binary_keys=args.binary_keys)
+    elif args.numpy and is_numpy_available():
+        file_data = sort_content_numpy(file_data, col_index, args.c_type, args.delimiter,
+                                       args.reverse, args.time_fmt, args.quoted, stats)
+    else:
+        file_data = sort_content(file_data, col_index, args.c_type, args.delimiter, args.reverse,
+                                 args.time_fmt, args.quoted, stats, args.binary_keys)
+    print_table(file_data, file,
+                need_to_mark_filename=len(args.files) > 1,
+                inplace=args.inplace,
+                hide_header=args.hide_header,
+                encoding=args.encoding)
+    if args.cache_stats:
+        # Rows are converted lazily, so all of them are converted once they are printed
+        if top or external:
+            stats.add(sorter.cache_info())
+        stats.report(file, col_index)
 
 
 def callback_sort(args):
     '''Performs sorting files on the command line request'''
     check_arguments(args)
-    for file in args.files:
-        file_data = read_file(file, not args.no_header)
-        col_index = (args.c_index
-                     if args.c_index is not None
-                     else get_indexes_by_names(file_data.header,
-                                               args.delimiter, args.c_name))
-        file_data = sort_content(file_data, col_index, args.c_type,
-                                 args.delimiter, args.reverse, args.time_fmt)
-        print_table(file_data, file,
-                    need_to_mark_filename=len(args.files) > 1,
-                    inplace=args.inplace,
-                    hide_header=args.hide_header)
+    args.files = get_input_files(args.files)
+    if args.inplace and STDIN_NAME in args.files:
+        raise ValueError("Standard input cannot be modified inplace")
+    # Unknown column names are reported before any table is read
+    columns = resolve_columns(args.files, args.c_index, args.c_name, not args.no_header,
+                              args.delimiter, args.encoding, args.quoted)
+    process_files(partial(sort_file, args, get_encoding(args.encoding), columns),
+                  args.files, args.jobs)
@@ -0,0 +1,110 @@
+from typing import Callable, List, Optional, Pattern, Tuple
+import datetime
+import re
+
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_MICROSECONDS_IN_SECOND = 10 ** 6
+# Fields which are parsed from fixed number of digits by the compiled parser
+_FIXED_FIELDS = {"Y": r"(\d{4})", "m": r"(\d\d)", "d": r"(\d\d)",
+                 "H": r"(\d\d)", "M": r"(\d\d)", "S": r"(\d\d)"}
+_FIELD_ORDER = "YmdHMS"
+
+
+def time_to_key(value: datetime.datetime) -> int:
+    '''Converts the time into the integer number of microseconds since datetime.min,
+    which has the same order as the time itself. Time with the time zone is
+    converted into UTC first, so it is ordered in the same way as datetime compares it.
+    '''
+    offset = value.utcoffset()
+    if offset is not None:
+        return (value.replace(tzinfo=None) - datetime.datetime.min - offset) // _MICROSECOND
+    return (value - datetime.datetime.min) // _MICROSECOND
+
+
+MAX_TIME_KEY = time_to_key(datetime.datetime.max)
+
+
+def _strptime_key(time_fmt: str, value: str) -> int:
+    try:
+        return time_to_key(datetime.datetime.strptime(value, time_fmt))
+    except:
+        return MAX_TIME_KEY
+
+
+def _compile_fixed_format(time_fmt: str) -> Optional[Tuple[Pattern, List[str]]]:
+    '''Returns the regular expression which matches values of the given format written
+    with the fixed number of digits, e.g. 2020-01-02 03:04:05 for the default format.
+    Groups of the expression are ordered as fields in the format.
+    None is returned if the format contains other directives, the same field twice or
+    fields which are not separated by literal symbols, since their values can be split
+    by strptime in another way. Literal symbols are matched exactly, while strptime
+    matches letters in any case and white spaces of any length, such values are
+    left to strptime. Digits are not allowed as literal symbols.
+    '''
+    pattern = []
+    fields = []
+    position = 0
+    while position < len(time_fmt):
+        char = time_fmt[position]
+        if char == "%":
+            field = time_fmt[position + 1:position + 2]
+            if field not in _FIXED_FIELDS or field in fields:
+                return None
+            if pattern and pattern[-1] in _FIXED_FIELDS.values():
+                return None
+            fields.append(field)
+            pattern.append(_FIXED_FIELDS[field])
+            position += 2
+        else:
+            if char.isdigit():
+                return None
+            pattern.append(re.escape(char))
+            position += 1
+    if not fields:
+        return None
+    return re.compile("".join(pattern), re.ASCII), fields
+
+
+def compile_time_parser(time_fmt: str) -> Callable[[str], int]:
+    '''Returns the function which converts the value in the given format into
+    the time key (see time_to_key) or into MAX_TIME_KEY if it cannot be parsed.
+    The result is the same as the one of datetime.datetime.strptime, but values
+    written in the common way (fixed number of digits in year, month, day, hour,
+    minute and second fields separated by punctuation, e.g. the default
+    "%Y-%m-%d %H:%M:%S" or ISO "%Y-%m-%dT%H:%M:%S") are parsed without it.
+    The rest of values and formats are still parsed by strptime.
+    '''
+    compiled = _compile_fixed_format(time_fmt)
+    if compiled is None:
+        def parse(value: str) -> int:
+            # Only the empty format matches the empty value
+            if not value and time_fmt:
+                return MAX_TIME_KEY
+            return _strptime_key(time_fmt, value)
+        return parse
+    regex, fields = compiled
+    positions = [fields.index(field) if field in fields else None for field in _FIELD_ORDER]
+    # strptime uses 1900-01-01 00:00:00 for the fields which are not in the format
+    defaults = (1900, 1, 1, 0, 0, 0)
+    # All fields are given in the usual order, e.g. in the default and ISO formats
+    complete = fields == list(_FIELD_ORDER)
+
+    def parse_fixed(value: str) -> int:
+        match = regex.fullmatch(value)
+        if match is None:
+            return _strptime_key(time_fmt, value) if value else MAX_TIME_KEY
+        if complete:
+            year, month, day, hour, minute, second = map(int, match.groups())
+        else:
+            groups = match.groups()
+            year, month, day, hour, minute, second = (
+                int(groups[position]) if position is not None else default
+                for position, default in zip(positions, defaults))
+        try:
+            days = datetime.date(year, month, day).toordinal() - 1
+        except ValueError:
+            return _strptime_key(time_fmt, value)
+        if hour > 23 or minute > 59 or second > 59:
+            return _strptime_key(time_fmt, value)
+        return (((days * 24 + hour) * 60 + minute) * 60 + second) * _MICROSECONDS_IN_SECOND
+    return parse_fixed
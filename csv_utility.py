@@ -1,4 +1,10 @@
-from typing import List, Tuple, Any, Union
+from typing import List, Tuple, Any, Union, Iterable, Iterator
+from itertools import islice
+import csv
+
+from csv_defaults import DEFAULT_SPLIT_BLOCK_SIZE
+
+QUOTE_CHAR = '"'
 
 
 def has_duplicates(data: List[Any]) -> bool:
@@ -8,7 +14,74 @@ def has_duplicates(data: List[Any]) -> bool:
     return len(data) != 0 and len(data) != len(unique_data)
 
 
-def get_indexes_by_names(header: str, delimiter: str, col_names: List[int]) -> List[int]:
+def check_quoted_delimiter(delimiter: str) -> None:
+    '''Raises ValueError if the given delimiter cannot be used for the quoted table'''
+    if len(delimiter) != 1 or delimiter == QUOTE_CHAR:
+        raise ValueError("Quoted table delimiter should be a single symbol other than the quote")
+
+
+def _parse_quoted(rows: List[str], delimiter: str) -> List[List[str]]:
+    '''Splits the given rows into values according to RFC 4180 quoting rules.
+    Each row should be a complete line, values spanning several lines are not supported.
+    '''
+    try:
+        res = list(csv.reader(rows, delimiter=delimiter, quotechar=QUOTE_CHAR,
+                              doublequote=True, strict=True))
+    except csv.Error as err:
+        raise ValueError(f"Cannot parse quoted values: {err}") from None
+    if len(res) != len(rows):
+        raise ValueError("Quoted values which contain new line symbols are not supported")
+    # Empty line is parsed into empty list, while split returns single empty value
+    return [cells if cells else [""] for cells in res]
+
+
+def split_row(row: str, delimiter: str, quoted: bool = False) -> List[str]:
+    '''Splits the given row into values by the delimiter.
+    If quoted is set, delimiters inside quoted values do not separate values
+    and quotes are removed from the result. Rows without quote symbols
+    are split in the same way regardless the quoted flag.
+    '''
+    if not quoted or QUOTE_CHAR not in row:
+        return row.split(delimiter)
+    return _parse_quoted([row], delimiter)[0]
+
+
+def split_rows(rows: Iterable[str], delimiter: str, quoted: bool = False,
+               block_size: int = DEFAULT_SPLIT_BLOCK_SIZE) -> Iterator[List[str]]:
+    '''Lazily yields values of the given rows split in the same way as split_row does.
+    Rows are processed by blocks, blocks which do not contain quote symbols
+    are split by the delimiter and only the rest of them are given to the csv parser.
+    '''
+    if not quoted:
+        yield from (row.split(delimiter) for row in rows)
+        return
+    rows = iter(rows)
+    while True:
+        block = list(islice(rows, block_size))
+        if not block:
+            return
+        if QUOTE_CHAR in ''.join(block):
+            yield from _parse_quoted(block, delimiter)
+        else:
+            yield from (row.split(delimiter) for row in block)
+
+
+def join_cells(cells: Iterable[str], delimiter: str, quoted: bool = False) -> str:
+    '''Joins values into the row by the delimiter.
+    If quoted is set, values which contain the delimiter, quote or new line symbols
+    are quoted, so the result can be split back by split_row.
+    '''
+    if not quoted:
+        return delimiter.join(cells)
+    special = (delimiter, QUOTE_CHAR, '\n', '\r')
+    return delimiter.join(
+        QUOTE_CHAR + cell.replace(QUOTE_CHAR, QUOTE_CHAR * 2) + QUOTE_CHAR
+        if any(el in cell for el in special) else cell
+        for cell in cells)
+
+
+def get_indexes_by_names(header: str, delimiter: str, col_names: List[int],
+                         quoted: bool = False) -> List[int]:
     '''Method will return list of indexes which corresponds to the input list of column names.
        Note that index list will be in the same order as list of names.
        Comparison is case sensitive, but ignores trailing white spaces
@@ -17,11 +90,12 @@ def get_indexes_by_names(header: str, delimiter: str, col_names: List[int]) -> L
        * there are duplicate names in the col_names argument
        * there is more than one occurrence the name from col_names in header
        If function return successfully there is no duplicates in the result list
+       If quoted is set, header values can be quoted (see split_row)
     '''
     req_names = [el.strip() for el in col_names]
     if has_duplicates(req_names):
         raise ValueError("there are duplicates among requested column names.")
-    name_list = [el.strip() for el in header.split(delimiter)]
+    name_list = [el.strip() for el in split_row(header, delimiter, quoted)]
 
     res = [0]*len(req_names)
     for i, name in enumerate(req_names):
@@ -36,7 +110,8 @@ def get_indexes_by_names(header: str, delimiter: str, col_names: List[int]) -> L
     return res
 
 
-def select_from_row(row: str, delimiter: str, col_indexes: List[int]) -> str:
+def select_from_row(row: str, delimiter: str, col_indexes: List[int],
+                    quoted: bool = False) -> str:
     '''Filters the given row in the way, that only the given column indexes are left in it.
        Columns in the row are defined by delimiter.
        Note that the result will be still string with the same delimiter but
@@ -44,8 +119,9 @@ def select_from_row(row: str, delimiter: str, col_indexes: List[int]) -> str:
        Regardless to the order of indexes in col_indexes argument the value orders in the result
        will be the same as in the row.
        If col_index contains duplicate values corresponding values from row will also be also duplicated
+       If quoted is set, values are split and joined back according to the quoting rules
     '''
-    l = row.split(delimiter)
+    l = split_row(row, delimiter, quoted)
     res = [""]*len(col_indexes)
     for i, c in enumerate(sorted(col_indexes)):
         if c >= len(l):
@@ -53,7 +129,7 @@ def select_from_row(row: str, delimiter: str, col_indexes: List[int]) -> str:
                 f"There is no column with index {c} in a row {row}")
         else:
             res[i] = l[c]
-    return delimiter.join(res)
+    return join_cells(res, delimiter, quoted)
 
 
 def ranges_to_int_sequence(ranges: List[Tuple[int]]) -> List[int]:
@@ -81,6 +157,50 @@ def ranges_to_int_sequence(ranges: List[Tuple[int]]) -> List[int]:
     return res
 
 
+def unite_ranges(ranges: List[Tuple[int]]) -> List[Tuple[int]]:
+    '''Converts the list of ranges sorted by the left edge into the list of
+       non empty ranges which do not intersect each other and cover the same integers.
+       For example, input [(1, 3), (2, 5), (7, 7), (8, 9)] will be converted into [(1, 5), (8, 9)].
+       The result is sorted by the left edge.
+    '''
+    res = []
+    for begin, end in ranges:
+        if begin >= end:
+            continue
+        if res and begin <= res[-1][1]:
+            res[-1] = (res[-1][0], max(res[-1][1], end))
+        else:
+            res.append((begin, end))
+    return res
+
+
+def invert_ranges(ranges: List[Tuple[int]], full_range: Tuple[int]) -> List[Tuple[int]]:
+    '''Returns the list of ranges which cover all integers from full_range that are
+       not covered by the given ranges. Function expects the given ranges to be
+       sorted, not intersecting and lying within full_range (see unite_ranges).
+    '''
+    res = []
+    start = full_range[0]
+    for begin, end in ranges:
+        if start < begin:
+            res.append((start, begin))
+        start = max(start, end)
+    if start < full_range[1]:
+        res.append((start, full_range[1]))
+    return res
+
+
+def select_by_ranges(data: Iterable[Any], ranges: List[Tuple[int]]) -> Iterator[Any]:
+    '''Lazily yields only those elements of data which indexes are covered by the given ranges.
+       Function expects the ranges to be sorted and not intersecting (see unite_ranges).
+    '''
+    data = iter(data)
+    position = 0
+    for begin, end in ranges:
+        yield from islice(data, begin - position, end - position)
+        position = end
+
+
 def cross_ranges(lhs: Tuple[int], rhs: Tuple[int]) -> Tuple[int]:
     '''Accepts two ranges defined by semi-interval (the first value is included and the second is not),
        and returns the intersection of these two ranges as a semi-interval.
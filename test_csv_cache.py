@@ -0,0 +1,129 @@
+from argparse import Namespace
+import datetime
+import os
+
+import pytest
+
+import csv_cache
+import csv_columnar
+import csv_time
+from csv_defaults import *
+from utils_for_tests import create_default_file_params, \
+    create_file
+
+
+def create_default_cache_args() -> Namespace:
+    args = create_default_file_params()
+    args.time_fmt = DEFAULT_TIME_FORMAT
+    return args
+
+
+def test_cache_matches_table(tmp_path):
+    header = "name;value;time"
+    rows = ("b;2;2020-01-01 00:00:00", "a; 1;bad", "b;nan;2019-01-01 00:00:00", "é;x; 2018-01-01 00:00:00")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    settings = csv_columnar.get_cache_settings(";", True, None, False)
+    with csv_columnar.TableCache.open(str(fpath), settings) as cache:
+        table = cache.table
+        assert table.header == header
+        assert table.row_count == len(rows)
+        assert tuple(table.rows()) == rows
+        assert list(table.distinct_values(0)) == ["b", "a", "é"]
+        assert [table.distinct_values(0)[code] for code in (2, 0)] == ["é", "b"]
+        # Keys of columns without numbers or time values are not cached
+        assert cache.number_keys(0) is None
+        assert cache.time_keys(0, DEFAULT_TIME_FORMAT) is None
+        assert list(table.column_codes(0)) == [0, 1, 0, 2]
+        assert list(cache.number_keys(1)) == [2.0, 1.0, float("inf"), float("inf")]
+        assert list(cache.time_keys(2, DEFAULT_TIME_FORMAT)) == [
+            csv_time.time_to_key(el) for el in (datetime.datetime(2020, 1, 1), datetime.datetime.max,
+                                                 datetime.datetime(2019, 1, 1),
+                                                 datetime.datetime(2018, 1, 1))]
+        assert cache.time_keys(2, "%Y") is None
+    # Table without rows and without header
+    fpath = create_file(tmp_path / "empty.csv", ())
+    csv_cache.cache_table(str(fpath), False, ";", None, False, DEFAULT_TIME_FORMAT)
+    settings = csv_columnar.get_cache_settings(";", False, None, False)
+    with csv_columnar.TableCache.open(str(fpath), settings) as cache:
+        assert cache.table.header is None
+        assert cache.table.row_count == 0
+
+
+def test_cache_is_ignored_when_outdated(tmp_path):
+    fpath = create_file(tmp_path / "test.csv", ("header", "1", "2"))
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    assert os.path.exists(csv_columnar.get_cache_path(str(fpath)))
+    cache = csv_columnar.open_table_cache(str(fpath), ";", True, None, False)
+    assert cache is not None
+    cache.close()
+    # Other reading settings
+    assert csv_columnar.open_table_cache(str(fpath), ",", True, None, False) is None
+    assert csv_columnar.open_table_cache(str(fpath), ";", False, None, False) is None
+    assert csv_columnar.open_table_cache(str(fpath), ";", True, None, True) is None
+    assert csv_columnar.open_table_cache(str(fpath), ";", True, "utf-16", False) is None
+    # Modified table
+    create_file(fpath, ("header", "1", "3"))
+    assert csv_columnar.open_table_cache(str(fpath), ";", True, None, False) is None
+    # Corrupted cache
+    create_file(tmp_path / "test.csv.csvcache", ("garbage",))
+    assert csv_columnar.open_table_cache(str(fpath), ";", True, None, False) is None
+    assert csv_columnar.open_table_cache("-", ";", True, None, False) is None
+    assert csv_columnar.open_table_cache(str(tmp_path / "missing.csv"), ";", True, None, False) is None
+
+
+def test_cache_with_broken_metadata_is_ignored(tmp_path):
+    fpath = create_file(tmp_path / "test.csv", ("header", "1", "2"))
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    cache_path = csv_columnar.get_cache_path(str(fpath))
+    data = open(cache_path, "rb").read()
+    metadata_size = csv_columnar._CACHE_HEADER.unpack_from(data)[-1]
+    for metadata in (b"{", b"{}", b'{"delimiter": ";"}', b"[1]"):
+        # The header of the cache is valid, only the metadata is broken
+        with open(cache_path, "wb") as out:
+            out.write(data[:-metadata_size] + metadata.ljust(metadata_size))
+        assert csv_columnar.open_table_cache(str(fpath), ";", True, None, False) is None
+
+
+def test_cache_values_are_decoded_on_access(tmp_path):
+    rows = tuple(f"id{i};{i % 2}" for i in range(100, 200))
+    fpath = create_file(tmp_path / "test.csv", ("id;value", *rows))
+    os.chmod(fpath, 0o640)
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    cache_path = csv_columnar.get_cache_path(str(fpath))
+    assert os.stat(cache_path).st_mode & 0o777 == 0o640
+    # The value of the last row cannot be decoded, but it is not displayed
+    data = open(cache_path, "rb").read()
+    with open(cache_path, "wb") as out:
+        out.write(data.replace(b"id199", b"id\xff\xff\xff"))
+    cache = csv_columnar.open_table_cache(str(fpath), ";", True, None, False)
+    with cache:
+        assert list(cache.table.rows_in_ranges([(0, 2)])) == list(rows[:2])
+        with pytest.raises(UnicodeDecodeError):
+            list(cache.table.rows())
+
+
+def test_cache_rejects_inexact_tables(tmp_path):
+    fpath = create_file(tmp_path / "test.csv", ("a;b", "1;2", "3"))
+    with pytest.raises(ValueError):
+        csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    # Unnecessary quotes are not restored by joining quoted values
+    fpath = create_file(tmp_path / "test.csv", ("a;b", '"1";2'))
+    with pytest.raises(ValueError):
+        csv_cache.cache_table(str(fpath), True, ";", None, True, DEFAULT_TIME_FORMAT)
+    assert not os.path.exists(csv_columnar.get_cache_path(str(fpath)))
+
+
+def test_callback_cache(tmp_path):
+    files = [create_file(tmp_path / f"test_{i}.csv", ("a;b", f"{i};x")) for i in range(2)]
+    args = create_default_cache_args()
+    args.delimiter = ";"
+    args.files = files
+    csv_cache.callback_cache(args)
+    for fpath in files:
+        cache = csv_columnar.open_table_cache(str(fpath), ";", True, None, False)
+        assert cache is not None
+        cache.close()
+    args.files = ["-"]
+    with pytest.raises(ValueError):
+        csv_cache.callback_cache(args)
@@ -0,0 +1,57 @@
+import csv_columnar
+from csv_read_write import FileContent, \
+    StreamContent
+
+
+def test_split_columns():
+    fc = FileContent("a;b", ("1;x", "2;y", "1;x", "3; x"))
+    table = csv_columnar.split_columns(fc, ";", batch_size=3)
+    assert table.header == "a;b"
+    assert table.row_count == 4
+    assert table.column_count == 2
+    assert table.distinct_values(0) == ["1", "2", "3"]
+    assert table.distinct_values(1) == ["x", "y", " x"]
+    assert list(table.rows(batch_size=3)) == list(fc.content)
+    assert table.to_stream().header == "a;b"
+    # Rows given by the iterator are joined back from the columns
+    table = csv_columnar.split_columns(StreamContent("a;b", iter(fc.content)), ";")
+    assert list(table.rows(batch_size=3)) == list(fc.content)
+    assert list(table.sort([(0, [-int(v) for v in table.distinct_values(0)])], False).rows()) == \
+        ["3; x", "2;y", "1;x", "1;x"]
+
+
+def test_split_columns_special_cases():
+    empty = csv_columnar.split_columns(FileContent("a;b", tuple()), ";")
+    assert empty.row_count == 0
+    assert empty.column_count == 0
+    assert list(empty.rows()) == []
+    # Rows with different number of columns cannot be split into columns
+    assert csv_columnar.split_columns(FileContent(None, ("1;2", "3")), ";") is None
+    assert csv_columnar.split_columns(FileContent(None, ("1;2", "3;4;5")), ";") is None
+    single = csv_columnar.split_columns(FileContent(None, ("", "a", "")), ";")
+    assert list(single.rows()) == ["", "a", ""]
+
+
+def test_select_and_sort():
+    fc = FileContent(None, ("b;2", "a;1", "c;2", "a;3", "b;1"))
+    table = csv_columnar.split_columns(fc, ";")
+    values = table.distinct_values(0)
+    selected = table.select(0, [v != "c" for v in values])
+    assert list(selected.rows()) == ["b;2", "a;1", "a;3", "b;1"]
+    # Sorting keeps the order of rows with equal keys in both directions
+    keys = [(1, [int(v) for v in selected.distinct_values(1)])]
+    assert list(selected.sort(keys, False).rows()) == ["a;1", "b;1", "b;2", "a;3"]
+    assert list(selected.sort(keys, True).rows()) == ["a;3", "b;2", "a;1", "b;1"]
+    keys = [(0, list(values)), (1, [-int(v) for v in table.distinct_values(1)])]
+    assert list(table.sort(keys, False).rows()) == ["a;3", "a;1", "b;2", "b;1", "c;2"]
+    # The original table is not changed
+    assert list(table.rows()) == list(fc.content)
+
+
+def test_split_quoted_columns():
+    rows = ('a;"b;c"', '"x""y";z', 'a;z')
+    table = csv_columnar.split_columns(StreamContent(None, iter(rows)), ";", quoted=True)
+    assert table.distinct_values(0) == ["a", 'x"y']
+    assert table.distinct_values(1) == ["b;c", "z"]
+    # Values are quoted back only when it is necessary
+    assert list(table.rows()) == ['a;"b;c"', '"x""y";z', 'a;z']
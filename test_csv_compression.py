@@ -0,0 +1,234 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import pytest
+
+import csv_compression
+import csv_read_write as crw
+import csv_show
+import csv_sort
+from test_csv_show import create_default_show_args
+from test_csv_sort import create_default_sort_args
+from utils_for_tests import feed_fifo
+
+
+COMPRESSORS = {"gzip": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}
+
+
+def test_detect_compression(tmp_path):
+    fpath = tmp_path / 'test.csv'
+    for name, compress in COMPRESSORS.items():
+        fpath.write_bytes(compress(b"a;b\n1;2"))
+        assert csv_compression.detect_compression(fpath) == name
+    for plain in (b"", b"a;b\n1;2", b"BZh9 is not bz2 stream"):
+        fpath.write_bytes(plain)
+        assert csv_compression.detect_compression(fpath) is None
+    assert csv_compression.detect_compression(tmp_path / 'missing.csv') is None
+
+
+def test_background_reader():
+    data = bytes(range(256)) * 1000
+    reader = csv_compression.BackgroundReader(io.BytesIO(data), chunk_size=1000,
+                                              queue_size=2)
+    assert reader.read() == data
+    reader.close()
+    # closing before the end stops the background thread
+    reader = csv_compression.BackgroundReader(io.BytesIO(data), chunk_size=10,
+                                              queue_size=1)
+    assert reader.read(5) == data[:5]
+    reader.close()
+    assert not reader._thread.is_alive()
+
+
+def test_background_reader_error():
+    class BrokenStream(io.RawIOBase):
+        def readinto(self, buffer):
+            raise OSError("broken")
+
+    reader = csv_compression.BackgroundReader(BrokenStream())
+    with pytest.raises(OSError):
+        reader.read()
+    reader.close()
+
+
+def test_read_compressed_files(tmp_path):
+    text = "h;v\n1;one\n2;two\n3;three\n"
+    fpath = tmp_path / 'test.csv'
+    for compress in COMPRESSORS.values():
+        fpath.write_bytes(compress(text.encode()))
+        res = crw.read_file(fpath, has_header=True)
+        assert res.header == "h;v"
+        assert res.content == ("1;one", "2;two", "3;three")
+        res = crw.stream_file(fpath, has_header=False)
+        assert list(res.content) == ["h;v", "1;one", "2;two", "3;three"]
+
+
+def test_show_compressed_file(tmp_path, capsys):
+    fpath = tmp_path / 'test.csv.gz'
+    fpath.write_bytes(gzip.compress(b"h;v\n1;one\n2;two\n3;three\n"))
+    args = create_default_show_args()
+    args.delimiter = ';'
+    args.files = [fpath]
+    args.r_tail = 2
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == "h;v\n2;two\n3;three\n"
+    args.r_tail = None
+    args.r_index = [1]
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == "h;v\n2;two\n"
+    args.r_tail = 1
+    args.except_flag = True
+    args.c_index = [0]
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == "v\none\n"
+
+
+def test_sort_compressed_file(tmp_path, capsys):
+    fpath = tmp_path / 'test.csv.xz'
+    fpath.write_bytes(lzma.compress(b"h;v\n3;three\n1;one\n2;two"))
+    args = create_default_sort_args()
+    args.delimiter = ';'
+    args.files = [fpath]
+    args.c_index = [0]
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == "h;v\n1;one\n2;two\n3;three\n"
+
+
+def test_background_writer():
+    target = io.BytesIO()
+    writer = csv_compression.BackgroundWriter(target, queue_size=1)
+    for i in range(100):
+        writer.write(b"%d\n" % i)
+    writer.close()
+    assert target.getvalue() == b"".join(b"%d\n" % i for i in range(100))
+
+    class BrokenStream(io.RawIOBase):
+        def writable(self):
+            return True
+
+        def write(self, data):
+            raise OSError("broken")
+
+    writer = csv_compression.BackgroundWriter(BrokenStream())
+    writer.write(b"data")
+    with pytest.raises(OSError):
+        writer.close()
+
+
+def test_open_compressed_output():
+    decompressors = {"gzip": gzip.decompress, "bz2": bz2.decompress,
+                     "xz": lzma.decompress}
+    data = b"a;b\n" * 10000
+    for name, decompress in decompressors.items():
+        out = io.BytesIO()
+        with csv_compression.open_compressed_output(out, name) as compressed:
+            compressed.write(data)
+        assert decompress(out.getvalue()) == data
+
+
+def test_sort_compressed_file_inplace(tmp_path):
+    fpath = tmp_path / 'test.csv.gz'
+    fpath.write_bytes(gzip.compress(b"h;v\n3;three\n1;one\n2;two"))
+    args = create_default_sort_args()
+    args.delimiter = ';'
+    args.files = [fpath]
+    args.c_index = [0]
+    args.inplace = True
+    csv_sort.callback_sort(args)
+    assert gzip.decompress(fpath.read_bytes()) == b"h;v\n1;one\n2;two\n3;three"
+
+
+def set_stdin(monkeypatch, data: bytes) -> None:
+    monkeypatch.setattr('sys.stdin', io.TextIOWrapper(io.BufferedReader(io.BytesIO(data))))
+
+
+def test_read_standard_input(monkeypatch):
+    for data in (b"h;v\n1;one\n2;two", gzip.compress(b"h;v\n1;one\n2;two")):
+        set_stdin(monkeypatch, data)
+        assert csv_compression.detect_compression(csv_compression.STDIN_NAME) == \
+            (None if data.startswith(b"h") else "gzip")
+        res = crw.read_file(csv_compression.STDIN_NAME, has_header=True)
+        assert res.header == "h;v"
+        assert res.content == ("1;one", "2;two")
+
+
+def test_read_named_pipe(tmp_path, capsys):
+    fifo = tmp_path / "table.csv"
+    os.mkfifo(fifo)
+    assert csv_compression.is_stream_input(fifo)
+    assert not csv_compression.is_seekable_input(fifo)
+    # Nothing is read from the pipe to detect the compression
+    assert csv_compression.detect_compression(fifo) is None
+    assert not csv_compression.is_stream_input(tmp_path / "missing.csv")
+
+    table = b"h;v\n2;two\n1;one\n3;three"
+    for data in (table, gzip.compress(table)):
+        thread = feed_fifo(fifo, data)
+        args = create_default_sort_args()
+        args.delimiter = ';'
+        args.files = [str(fifo)]
+        args.c_index = [0]
+        csv_sort.callback_sort(args)
+        thread.join()
+        assert capsys.readouterr().out == "h;v\n1;one\n2;two\n3;three\n"
+        # Columns given by names are found by the header of the pipe
+        thread = feed_fifo(fifo, data)
+        args.c_index = None
+        args.c_name = ["h"]
+        csv_sort.callback_sort(args)
+        thread.join()
+        assert capsys.readouterr().out == "h;v\n1;one\n2;two\n3;three\n"
+
+        thread = feed_fifo(fifo, data)
+        args = create_default_show_args()
+        args.delimiter = ';'
+        args.files = [str(fifo)]
+        args.r_tail = 2
+        csv_show.callback_show(args)
+        thread.join()
+        assert capsys.readouterr().out == "h;v\n1;one\n3;three\n"
+
+        thread = feed_fifo(fifo, data)
+        args.c_name = ["v"]
+        csv_show.callback_show(args)
+        thread.join()
+        assert capsys.readouterr().out == "v\none\nthree\n"
+
+
+def test_get_input_files():
+    assert csv_compression.get_input_files(None) == [csv_compression.STDIN_NAME]
+    assert csv_compression.get_input_files([]) == [csv_compression.STDIN_NAME]
+    assert csv_compression.get_input_files(["a", "b"]) == ["a", "b"]
+    assert csv_compression.get_input_files(["a", "-"]) == ["a", "-"]
+    with pytest.raises(ValueError):
+        csv_compression.get_input_files(["-", "a", "-"])
+
+
+def test_show_standard_input(monkeypatch, capsys):
+    args = create_default_show_args()
+    args.delimiter = ';'
+    args.files = None
+    args.r_tail = 1
+    set_stdin(monkeypatch, b"h;v\n1;one\n2;two\n")
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == "h;v\n2;two\n"
+    args.r_tail = None
+    args.r_head = 1
+    set_stdin(monkeypatch, b"h;v\n1;one\n2;two\n")
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == "h;v\n1;one\n"
+
+
+def test_sort_standard_input(monkeypatch, capsys):
+    args = create_default_sort_args()
+    args.delimiter = ';'
+    args.files = ["-"]
+    args.c_index = [0]
+    set_stdin(monkeypatch, b"h;v\n2;two\n1;one\n")
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == "h;v\n1;one\n2;two\n"
+    args.inplace = True
+    with pytest.raises(ValueError):
+        csv_sort.callback_sort(args)
@@ -0,0 +1,52 @@
+import sys
+
+import pytest
+
+import csv_external
+
+
+def test_parse_size():
+    assert csv_external.parse_size("100") == 100
+    assert csv_external.parse_size("2K") == 2048
+    assert csv_external.parse_size("1.5m") == 3 << 19
+    assert csv_external.parse_size("8GB") == 8 << 30
+    for text in ("", "G", "-1", "0", "ten"):
+        with pytest.raises(ValueError):
+            csv_external.parse_size(text)
+
+
+def test_write_and_read_run(tmp_path):
+    pairs = [((float(i), "x"), str(i)) for i in range(10)]
+    for batch_size in (1, 3, 100):
+        run = csv_external.write_run(pairs, str(tmp_path), batch_size)
+        # The run file is anonymous
+        assert list(tmp_path.iterdir()) == []
+        assert list(csv_external.read_run(run)) == pairs
+        assert run.closed
+    assert list(csv_external.read_run(csv_external.write_run([], None))) == []
+
+
+def test_sort_externally_is_stable(tmp_path):
+    rows = [f"{(i * 7) % 13};{i}" for i in range(500)]
+
+    def get_keys(chunk):
+        return [int(row.split(';')[0]) for row in chunk]
+
+    row_size = sys.getsizeof(rows[0])
+    for max_memory in (1, row_size * 2, row_size * 20, row_size * 2000):
+        for reverse in (False, True):
+            expected = sorted(rows, key=lambda row: int(row.split(';')[0]), reverse=reverse)
+            res = csv_external.sort_externally(iter(rows), get_keys, reverse, max_memory,
+                                               str(tmp_path), batch_size=7)
+            assert list(res) == expected
+    assert list(csv_external.sort_externally(iter(()), get_keys, False, 1)) == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sort_externally_closes_runs_early(tmp_path):
+    rows = [str(i % 10) for i in range(100)]
+    res = csv_external.sort_externally(iter(rows), lambda chunk: list(map(int, chunk)),
+                                       False, 1, str(tmp_path))
+    assert next(res) == "0"
+    res.close()
+    assert list(tmp_path.iterdir()) == []
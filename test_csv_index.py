@@ -0,0 +1,73 @@
+import csv_index
+import csv_read_write as crw
+from utils_for_tests import create_file
+
+
+def test_build_line_offsets():
+    assert list(csv_index.build_line_offsets(b"")) == []
+    assert list(csv_index.build_line_offsets(b"\n")) == [0]
+    assert list(csv_index.build_line_offsets(b"a")) == [0]
+    assert list(csv_index.build_line_offsets(b"a\nbc\nd")) == [0, 2, 5]
+    assert list(csv_index.build_line_offsets(b"a\nbc\n")) == [0, 2]
+    assert list(csv_index.build_line_offsets(b"\n\n")) == [0, 1]
+
+
+def test_indexed_table_matches_read_file(tmp_path):
+    fpath = tmp_path / 'test.csv'
+    contents = (b"", b"header", b"header\n", b"h\n1\n2\n3", b"h\n1\n\n3\n",
+                b"h\r\n1\r\n2", "h\né\n".encode())
+    for data in contents:
+        fpath.write_bytes(data)
+        for has_header in (True, False):
+            expected = crw.read_file(fpath, has_header)
+            with csv_index.IndexedTable(fpath, has_header) as table:
+                assert table.header == expected.header
+                assert table.row_count == len(expected.content)
+                assert tuple(table.rows([(0, table.row_count)])) == expected.content
+
+
+def test_indexed_table_random_access(tmp_path):
+    fpath = create_file(tmp_path / 'test.csv',
+                        ("header", *(str(i) for i in range(10))))
+    with csv_index.IndexedTable(fpath, has_header=True) as table:
+        assert table.row_count == 10
+        assert table.row(0) == "0"
+        assert table.row(9) == "9"
+        assert table.row(10) is None
+        assert list(table.rows([(1, 3), (8, 20)])) == ["1", "2", "8", "9"]
+
+
+def test_sidecar_is_reused_and_rebuilt(tmp_path):
+    fpath = create_file(tmp_path / 'test.csv', ("header", "1", "2"))
+    sidecar = tmp_path / ('test.csv' + csv_index.SIDECAR_SUFFIX)
+    with csv_index.IndexedTable(fpath, has_header=True, use_sidecar=True) as table:
+        assert list(table.rows([(0, 2)])) == ["1", "2"]
+    assert sidecar.exists()
+    stat = fpath.stat()
+    loaded = csv_index.load_sidecar(fpath, stat)
+    assert loaded is not None
+    index_map, offsets = loaded
+    assert list(offsets) == [0, 7, 9]
+    offsets.release()
+    index_map.close()
+    with csv_index.IndexedTable(fpath, has_header=True, use_sidecar=True) as table:
+        assert table.row_count == 2
+        assert list(table.rows([(0, 2)])) == ["1", "2"]
+    # modified file makes the sidecar stale
+    create_file(fpath, ("header", "10", "20", "30"))
+    assert csv_index.load_sidecar(fpath, fpath.stat()) is None
+    with csv_index.IndexedTable(fpath, has_header=True, use_sidecar=True) as table:
+        assert list(table.rows([(0, 3)])) == ["10", "20", "30"]
+    assert csv_index.load_sidecar(fpath, fpath.stat()) is not None
+
+
+def test_indexed_table_row_limit(tmp_path):
+    fpath = create_file(tmp_path / 'test.csv',
+                        ("header", *(str(i) for i in range(10))))
+    for limit in (0, 1, 5, 10, 20):
+        with csv_index.IndexedTable(fpath, has_header=True, row_limit=limit) as table:
+            assert table.header == "header"
+            assert table.row_count == min(limit, 10)
+            assert list(table.rows([(0, 20)])) == [str(i) for i in range(min(limit, 10))]
+    with csv_index.IndexedTable(fpath, has_header=False, row_limit=1) as table:
+        assert list(table.rows([(0, 20)])) == ["header"]
@@ -0,0 +1,46 @@
+import math
+import random
+import sys
+
+from csv_keys import encode_number, \
+    encode_integer, \
+    encode_string
+from csv_time import MAX_TIME_KEY
+
+
+def check_order(values, encode):
+    encoded = [encode(value) for value in values]
+    for a, key_a in zip(values, encoded):
+        for b, key_b in zip(values, encoded):
+            assert (a < b) == (key_a < key_b)
+            assert (a == b) == (key_a == key_b)
+
+
+def test_encode_number():
+    check_order([-math.inf, -1e308, -2.5, -1.0, -5e-324, -0.0, 0.0, 5e-324, 1e-300,
+                 1.0, 1.5, sys.float_info.max, math.inf], encode_number)
+    assert all(len(encode_number(value)) == 8 for value in (-math.inf, 0.0, 1.0))
+
+
+def test_encode_integer():
+    check_order([-(1 << 63), -5, -1, 0, 1, 5, MAX_TIME_KEY, (1 << 63) - 1], encode_integer)
+
+
+def test_encode_string():
+    check_order(["", "\x00", "\x00\x00", "\x00a", "a", "a\x00", "a\x00\x01", "a\x01", "ab", "b",
+                 "\x7f", "\xe9", "\ud7ff", "\udc80", "\ue000", "\uffff", "\U00010000"], encode_string)
+
+
+def test_composite_keys_keep_tuple_order():
+    generator = random.Random(3)
+    numbers = (-1.5, -0.0, 0.0, 2.0, math.inf)
+    strings = ("", "\x00", "a", "a\x00", "ab", "é")
+    keys = [(generator.choice(numbers), generator.choice(strings), generator.randint(-3, 3))
+            for _ in range(300)]
+
+    def encode(key):
+        return encode_number(key[0]) + encode_string(key[1]) + encode_integer(key[2])
+    for reverse in (False, True):
+        expected = sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+        encoded = [encode(key) for key in keys]
+        assert sorted(range(len(keys)), key=encoded.__getitem__, reverse=reverse) == expected
@@ -0,0 +1,57 @@
+import math
+import random
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import csv_numpy
+import csv_sort
+from csv_read_write import FileContent
+from csv_defaults import *
+
+
+def test_number_array():
+    convert = csv_sort.RowSorter([0], ["number"], ";", DEFAULT_TIME_FORMAT).converters[0]
+    for values in (("1", "-2.5", "nan", "1e400"), ("1", "x", "", "-nan", "0x10")):
+        res = csv_numpy.number_array(values, convert)
+        assert res.dtype == numpy.float64
+        assert res.tolist() == [convert(el) for el in values]
+    assert csv_numpy.number_array(("nan",), convert).tolist() == [math.inf]
+
+
+def test_rank_array():
+    assert csv_numpy.rank_array(("b", "a", "é", "a", "")).tolist() == [2, 1, 3, 1, 0]
+
+
+def test_stable_order():
+    columns = [numpy.array([1.0, 0.0, 1.0, -0.0, math.inf]), numpy.array([1, 1, 0, 1, 0])]
+    rows = list(zip(*(column.tolist() for column in columns)))
+    for reverse in (False, True):
+        expected = sorted(range(len(rows)), key=rows.__getitem__, reverse=reverse)
+        assert csv_numpy.stable_order(columns, reverse) == expected
+        expected = sorted(range(len(rows)), key=lambda i: rows[i][0], reverse=reverse)
+        assert csv_numpy.stable_order(columns[:1], reverse) == expected
+
+
+def test_sort_content_numpy_matches_sort_content():
+    generator = random.Random(7)
+    numbers = ("1", "2.5", "-0.0", "0", "nan", "", "x", "1e400", "-inf", " 3 ")
+    times = ("2020-01-02 03:04:05", "2019-12-31 23:59:59", "bad", "", "2020-1-2 3:4:5")
+    strings = ("a", "b", " a", "é", "")
+    rows = tuple(';'.join((generator.choice(numbers), generator.choice(times),
+                           generator.choice(strings), str(i))) for i in range(300))
+    file_data = FileContent("n;t;s;i", rows)
+    for col_indexes, col_types in (([0], ["number"]), ([1], ["time"]), ([2], ["string"]),
+                                   ([0, 1, 2], ["number", "time", "string"]),
+                                   ([2, 0], ["string", "number"])):
+        for reverse in (False, True):
+            for quoted in (False, True):
+                expected = csv_sort.sort_content(file_data, col_indexes, col_types, ";",
+                                                 reverse, DEFAULT_TIME_FORMAT, quoted)
+                res = csv_sort.sort_content_numpy(file_data, col_indexes, col_types, ";",
+                                                  reverse, DEFAULT_TIME_FORMAT, quoted)
+                assert res == expected
+    empty = FileContent("h", ())
+    assert csv_sort.sort_content_numpy(empty, [0], ["number"], ";", False,
+                                       DEFAULT_TIME_FORMAT) == empty
@@ -0,0 +1,62 @@
+from functools import partial
+
+import csv_parallel
+from utils_for_tests import create_file
+
+
+def read_ranges(filename, ranges):
+    return [list(csv_parallel.read_range(filename, *rng)) for rng in ranges]
+
+
+def test_split_into_ranges(tmp_path):
+    rows = [f"row {i}" * (i % 3) for i in range(20)]
+    fpath = create_file(tmp_path / "test.csv", ("header", *rows))
+    header, start = csv_parallel.read_raw_header(fpath, True)
+    assert header == b"header"
+    assert start == len("header\n")
+    for jobs in (1, 2, 3, 7, 100):
+        for chunk_size in (1, 10, 1 << 20):
+            ranges = csv_parallel.split_into_ranges(fpath, start, jobs, chunk_size)
+            assert ranges[0][0] == start
+            assert ranges[-1][1] == fpath.stat().st_size
+            assert all(lhs[1] == rhs[0] for lhs, rhs in zip(ranges, ranges[1:]))
+            assert sum(read_ranges(fpath, ranges), []) == [row.encode() for row in rows]
+    assert csv_parallel.read_raw_header(fpath, False) == (None, 0)
+
+
+def test_split_into_ranges_special_cases(tmp_path):
+    fpath = create_file(tmp_path / "empty.csv", ())
+    assert csv_parallel.split_into_ranges(fpath, 0, 4) == []
+    fpath = create_file(tmp_path / "header.csv", ("header",))
+    header, start = csv_parallel.read_raw_header(fpath, True)
+    assert csv_parallel.split_into_ranges(fpath, start, 4) == []
+    fpath = tmp_path / "windows.csv"
+    fpath.write_bytes(b"a\r\nb\r\n\r\nc")
+    ranges = csv_parallel.split_into_ranges(fpath, 0, 3)
+    assert sum(read_ranges(fpath, ranges), []) == [b"a", b"b", b"", b"c"]
+
+
+def test_map_ordered_keeps_order(tmp_path):
+    rows = [str(i) for i in range(50)]
+    fpath = create_file(tmp_path / "test.csv", rows)
+    ranges = csv_parallel.split_into_ranges(fpath, 0, 3, chunk_size=8)
+    assert len(ranges) > 3
+    results = csv_parallel.map_ordered(partial(csv_parallel.read_range, fpath), [], 2)
+    assert list(results) == []
+    worker = partial(_read_list, fpath)
+    assert sum(csv_parallel.map_ordered(worker, ranges, 3), []) == [row.encode() for row in rows]
+
+
+def _read_list(filename, byte_range):
+    return list(csv_parallel.read_range(filename, *byte_range))
+
+
+def test_split_into_chunks():
+    items = tuple(range(20))
+    assert csv_parallel.split_into_chunks((), 4) == []
+    for jobs in (1, 2, 3, 7, 100):
+        for chunk_size in (1, 6, 1 << 20):
+            chunks = csv_parallel.split_into_chunks(items, jobs, chunk_size)
+            assert sum(chunks, ()) == items
+            assert len(chunks) >= min(jobs, len(items))
+            assert all(0 < len(chunk) <= chunk_size for chunk in chunks)
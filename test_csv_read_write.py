@@ -1,3 +1,8 @@
+import io
+import threading
+
+import pytest
+
 import csv_read_write as crw
 from utils_for_tests import create_file
 
@@ -108,3 +113,168 @@ def test_convert_to_text():
     test = crw.FileContent('header', ['one'])
     assert crw.convert_to_text(test, hide_header=False) == 'header\none'
     assert crw.convert_to_text(test, hide_header=True) == 'one'
+
+
+def test_stream_file(tmp_path):
+    header = "one,two"
+    r1 = "1,2"
+    r2 = "3,4"
+    fpath = create_file(tmp_path / 'test.csv', (header, r1, r2))
+    res = crw.stream_file(fpath, has_header=True)
+    assert res.header == header
+    assert list(res.content) == [r1, r2]
+    res = crw.stream_file(fpath, has_header=False)
+    assert res.header is None
+    assert list(res.content) == [header, r1, r2]
+
+    fpath = tmp_path / 'empty.csv'
+    fpath.touch()
+    res = crw.stream_file(fpath, has_header=True)
+    assert res.header == ""
+    assert list(res.content) == []
+
+
+def test_peek_first_row():
+    first, rows = crw.peek_first_row(iter(()))
+    assert first is None
+    assert list(rows) == []
+    first, rows = crw.peek_first_row(iter(("a", "b")))
+    assert first == "a"
+    assert list(rows) == ["a", "b"]
+
+
+def test_print_stream_to_std_out_matches_text_output(capsys):
+    cases = ((None, []), ("header", []), (None, ["one", "two"]),
+             ("", ["one"]), ("header", ["one", "two"]))
+    for header, content in cases:
+        for hide_header in (False, True):
+            for mark in (False, True):
+                text = crw.convert_to_text(crw.FileContent(header, content),
+                                           hide_header)
+                crw.print_to_std_out(text, "name", mark)
+                expected = capsys.readouterr().out
+                crw.print_stream_to_std_out(crw.StreamContent(header, iter(content)),
+                                            "name", mark, hide_header)
+                assert capsys.readouterr().out == expected
+
+
+def test_read_tail_matches_read_file(tmp_path):
+    fpath = tmp_path / 'test.csv'
+    contents = (b"", b"header", b"header\n", b"h\n1\n2\n3", b"h\n1\n\n3\n",
+                b"h\r\n1\r\n2\r\n", b"h\n" + b"\n".join(b"%d" % i for i in range(100)))
+    for data in contents:
+        fpath.write_bytes(data)
+        for has_header in (True, False):
+            expected = crw.read_file(fpath, has_header)
+            for count in (0, 1, 2, 3, 50, 200):
+                for block_size in (1, 2, 3, 1024):
+                    res = crw.read_tail(fpath, has_header, count, block_size)
+                    assert res.header == expected.header
+                    assert res.content == (expected.content[-count:] if count else ())
+
+
+def test_write_lines():
+    import io
+    for terminate in (True, False):
+        for batch_size in (1, 2, 100):
+            for lines in ([], ["one"], ["one", "two", "three"]):
+                out = io.BytesIO()
+                written = crw.write_lines(out, lines, 'utf-8', terminate=terminate,
+                                          batch_size=batch_size)
+                expected = '\n'.join(lines) + ('\n' if terminate and lines else '')
+                assert written == bool(lines)
+                assert out.getvalue() == expected.encode()
+                out = io.StringIO()
+                crw.write_lines(out, lines, None, terminate=terminate,
+                                batch_size=batch_size)
+                assert out.getvalue() == expected
+
+
+def test_print_table_inplace(tmp_path):
+    fpath = tmp_path / 'test.csv'
+    cases = ((None, []), ("header", []), (None, ["one", "two"]),
+             ("", ["one"]), ("header", ["one", "two"]))
+    for header, content in cases:
+        crw.print_table(crw.StreamContent(header, iter(content)), fpath,
+                        need_to_mark_filename=True, inplace=True, hide_header=True)
+        assert fpath.read_text() == crw.convert_to_text(crw.FileContent(header, content),
+                                                        hide_header=False)
+
+
+def test_open_for_replace(tmp_path):
+    fpath = create_file(tmp_path / 'test.csv', ("one", "two"))
+    fpath.chmod(0o640)
+    with crw.open_for_replace(fpath) as out:
+        out.write(b"three")
+        # original is untouched until everything is written
+        assert fpath.read_text() == "one\ntwo"
+    assert fpath.read_text() == "three"
+    assert fpath.stat().st_mode & 0o777 == 0o640
+    try:
+        with crw.open_for_replace(fpath) as out:
+            out.write(b"four")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert fpath.read_text() == "three"
+    assert [p.name for p in tmp_path.iterdir()] == ['test.csv']
+
+
+def test_read_ahead():
+    rows = [str(i) for i in range(100)]
+    for batch_size in (1, 7, 1000):
+        assert list(crw.read_ahead(iter(rows), batch_size, queue_size=2)) == rows
+    # Sequences are read only once
+    assert list(crw.read_ahead(tuple(rows), batch_size=7)) == rows
+    assert list(crw.read_ahead(iter(()))) == []
+
+
+def test_read_ahead_early_close():
+    closed = []
+
+    def source():
+        try:
+            yield from (str(i) for i in range(10000))
+        finally:
+            closed.append(True)
+
+    before = threading.active_count()
+    rows = crw.read_ahead(source(), batch_size=10, queue_size=2)
+    assert next(rows) == "0"
+    rows.close()
+    assert closed == [True]
+    assert threading.active_count() == before
+
+
+def test_read_ahead_passes_errors():
+    def source():
+        yield "1"
+        raise ValueError("broken row")
+
+    rows = crw.read_ahead(source(), batch_size=1)
+    assert next(rows) == "1"
+    with pytest.raises(ValueError):
+        next(rows)
+
+
+def test_write_in_background():
+    out = io.BytesIO()
+    with crw.write_in_background(out, queue_size=2) as target:
+        assert target is not out
+        for i in range(100):
+            target.write(f"{i}\n".encode())
+    assert out.getvalue() == ''.join(f"{i}\n" for i in range(100)).encode()
+    assert not out.closed
+    with crw.write_in_background(out, enabled=False) as target:
+        assert target is out
+
+    class BrokenOutput(io.RawIOBase):
+        def writable(self):
+            return True
+
+        def write(self, data):
+            raise OSError("disk is full")
+
+    with pytest.raises(OSError):
+        with crw.write_in_background(BrokenOutput()) as target:
+            target.write(b"data")
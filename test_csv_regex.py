@@ -8,16 +8,24 @@ from utils_for_tests import merge_args, \
     create_default_file_params, \
     create_default_column_selector, \
     create_default_inplace_argument, \
+    create_default_columnar_argument, \
+    create_default_bytes_mode_argument, \
+    create_default_jobs_argument, \
     create_default_hide_header_argument, \
     convert_argparse_action_to_bool, \
-    create_file
+    create_file, \
+    run_with_options
 from csv_defaults import *
+import csv_cache
 
 
 def create_default_regex_args() -> Namespace:
     args = merge_args(create_default_file_params(),
                       create_default_column_selector(),
                       create_default_inplace_argument(),
+                      create_default_bytes_mode_argument(),
+                      create_default_columnar_argument(),
+                      create_default_jobs_argument(),
                       create_default_hide_header_argument())
     args.expression = DEFAULT_REGEX_EXPRESSION
     args.ignore_case = convert_argparse_action_to_bool(
@@ -376,3 +384,165 @@ def test_raise_error_for_invalid_regex(tmp_path) -> None:
     args.c_index = [0]
     with pytest.raises(ValueError):
         csv_regex.callback_regex(args)
+
+
+def test_compile_raw_regex() -> None:
+    assert csv_regex.compile_raw_regex("^a.c$", False).pattern == b"^a.c$"
+    assert csv_regex.compile_raw_regex("abc", True).flags & csv_regex.IGNORECASE
+    assert csv_regex.compile_raw_regex("é", False) is None
+    assert csv_regex.compile_raw_regex("a\\sb", False) is None
+    assert csv_regex.compile_raw_regex("[^\\S]", False) is None
+    assert csv_regex.compile_raw_regex("\\u00e9", False) is None
+
+
+def test_regex_bytes_mode_matches_text_mode(tmp_path, capsys) -> None:
+    header = "name;value"
+    rows = ("abc;1", "ábc;2", "Abc;3", "a c;4", "x;é", "é;é")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_regex_args()
+    args.files = [fpath]
+    args.delimiter = ';'
+    args.c_index = [0]
+    for expressions in (["^.bc$"], ["b"], ["^a"], ["é"], ["\\w\\s\\w"], ["\\u00e1"]):
+        for ignore_case in (False, True):
+            args.expression = expressions
+            args.ignore_case = ignore_case
+            args.bytes_mode = False
+            csv_regex.callback_regex(args)
+            expected = capsys.readouterr().out
+            args.bytes_mode = True
+            csv_regex.callback_regex(args)
+            assert capsys.readouterr().out == expected
+
+
+def test_regex_with_encoding(tmp_path, capsys) -> None:
+    fpath = tmp_path / "test.csv"
+    fpath.write_bytes("name;value\nété;1\nhiver;2".encode("latin-1"))
+    args = create_default_regex_args()
+    args.files = [fpath]
+    args.delimiter = ';'
+    args.c_name = ["name"]
+    args.expression = ["^é"]
+    args.encoding = "latin-1"
+    for bytes_mode in (False, True):
+        args.bytes_mode = bytes_mode
+        csv_regex.callback_regex(args)
+        assert capsys.readouterr().out == "name;value\nété;1\n"
+    args.inplace = True
+    csv_regex.callback_regex(args)
+    assert fpath.read_bytes() == "name;value\nété;1".encode("latin-1")
+
+
+def test_regex_columnar_matches_text_mode(tmp_path, capsys) -> None:
+    header = "name;value"
+    rows = ("abc;1", "ábc;2", "abc;3", "xyz;1", "Abc;1")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_regex_args()
+    args.files = [fpath]
+    args.delimiter = ';'
+    for c_index, expressions in (([0], ["^a"]), ([0, 1], ["bc", "1"]), ([1], ["4"])):
+        args.c_index = c_index
+        args.expression = expressions
+        args.columnar = False
+        csv_regex.callback_regex(args)
+        expected = capsys.readouterr().out
+        args.columnar = True
+        csv_regex.callback_regex(args)
+        assert capsys.readouterr().out == expected
+
+    args.c_index = [2]
+    args.expression = ["a"]
+    with pytest.raises(ValueError):
+        csv_regex.callback_regex(args)
+
+
+def test_regex_quoted_values(tmp_path, capsys) -> None:
+    header = 'name;"a;b"'
+    rows = ('"x;y";1', 'x;"2;3"', 'y;"a""b"', 'x;4')
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_regex_args()
+    args.files = [fpath]
+    args.delimiter = ';'
+    args.quoted = True
+    args.c_name = ["a;b"]
+    args.expression = ["^[0-9]$"]
+    for columnar in (False, True):
+        args.columnar = columnar
+        csv_regex.callback_regex(args)
+        assert capsys.readouterr().out == '\n'.join((header, '"x;y";1', 'x;4')) + '\n'
+    args.c_name = None
+    args.c_index = [0]
+    args.expression = ['^x$']
+    csv_regex.callback_regex(args)
+    assert capsys.readouterr().out == '\n'.join((header, 'x;"2;3"', 'x;4')) + '\n'
+    # Without the flag quotes are a part of the value
+    args.quoted = False
+    csv_regex.callback_regex(args)
+    assert capsys.readouterr().out == '\n'.join((header, 'x;"2;3"', 'x;4')) + '\n'
+    args.expression = ['^"']
+    csv_regex.callback_regex(args)
+    assert capsys.readouterr().out == '\n'.join((header, '"x;y";1')) + '\n'
+
+
+def test_regex_jobs_matches_single_process(tmp_path, capsys) -> None:
+    header = "name;value"
+    rows = tuple(f"{'ab'[i % 2]}{i};{i % 7}" for i in range(100))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_regex_args()
+    args.files = [fpath]
+    args.delimiter = ';'
+    args.c_index = [0, 1]
+    args.expression = ["^a", "[0-3]"]
+    for bytes_mode in (False, True):
+        args.bytes_mode = bytes_mode
+        args.jobs = 1
+        csv_regex.callback_regex(args)
+        expected = capsys.readouterr().out
+        args.jobs = 3
+        csv_regex.callback_regex(args)
+        assert capsys.readouterr().out == expected
+
+    args.inplace = True
+    csv_regex.callback_regex(args)
+    assert fpath.read_text() == expected[:-1]
+    args.jobs = 0
+    with pytest.raises(ValueError):
+        csv_regex.callback_regex(args)
+
+
+def test_regex_several_files_with_jobs(tmp_path, capsys) -> None:
+    header = "name;value"
+    files = [create_file(tmp_path / f"test_{i}.csv",
+                         (header, *(f"é{j};{(j * i) % 4}" for j in range(10))))
+             for i in range(4)]
+    args = create_default_regex_args()
+    args.files = files
+    args.delimiter = ';'
+    args.c_index = [1]
+    args.expression = ["[12]"]
+    args.jobs = 1
+    csv_regex.callback_regex(args)
+    expected = capsys.readouterr().out
+    for jobs in (2, 8):
+        args.jobs = jobs
+        csv_regex.callback_regex(args)
+        assert capsys.readouterr().out == expected
+    # Errors of workers are passed to the main process
+    args.c_index = [2]
+    with pytest.raises(ValueError):
+        csv_regex.callback_regex(args)
+
+
+def test_regex_with_cache_matches_text_mode(tmp_path, capsys) -> None:
+    header = "name;value"
+    rows = ("apple;1", "banana; 2", "apple;3", "cherry;1")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_regex_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    cases = [{"c_name": c_name, "expression": expression} for c_name, expression in (
+        (["name"], ["^a"]), (["value"], ["^1$"]), (["name", "value"], ["a", "1"]), (["name"], ["x"]))]
+    expected = [run_with_options(csv_regex.callback_regex, args, case, capsys).out for case in cases]
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    assert [run_with_options(csv_regex.callback_regex, args, case, capsys).out
+            for case in cases] == expected
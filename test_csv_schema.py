@@ -0,0 +1,62 @@
+import gzip
+import os
+
+import pytest
+
+import csv_schema
+from utils_for_tests import create_file
+
+
+def test_probe_schema(tmp_path):
+    fpath = create_file(tmp_path / "test.csv", ("a ; b;a;c", "1;2;3;4", "5;6;7"))
+    schema = csv_schema.probe_schema(fpath, True, ";")
+    assert schema.header == "a ; b;a;c"
+    assert schema.names == ["a", "b", "a", "c"]
+    assert schema.column_count == 4
+    assert schema.get_indexes(["c", "b "]) == [3, 1]
+    with pytest.raises(ValueError):
+        schema.get_indexes(["a"])
+    with pytest.raises(ValueError):
+        schema.get_indexes(["d"])
+
+    schema = csv_schema.probe_schema(fpath, False, ";")
+    assert schema.header is None
+    assert schema.names is None
+    assert schema.first_row == "a ; b;a;c"
+    assert schema.column_count == 4
+    with pytest.raises(ValueError):
+        schema.get_indexes(["a"])
+
+    fpath = create_file(tmp_path / "quoted.csv", ('"x;y";z',))
+    schema = csv_schema.probe_schema(fpath, True, ";", quoted=True)
+    assert schema.names == ["x;y", "z"]
+    assert schema.column_count == 2
+
+    fpath = tmp_path / "empty.csv"
+    fpath.touch()
+    assert csv_schema.probe_schema(fpath, True, ";").column_count == 1
+    assert csv_schema.probe_schema(fpath, False, ";").first_row is None
+
+    fpath = tmp_path / "test.csv.gz"
+    fpath.write_bytes(gzip.compress("é;b\n1;2\n".encode()))
+    assert csv_schema.probe_schema(fpath, True, ";", "utf-8").names == ["é", "b"]
+
+
+def test_resolve_columns(tmp_path):
+    files = [create_file(tmp_path / f"test_{i}.csv", (f"a;b;c{i}", "1;2;3")) for i in range(2)]
+    assert csv_schema.resolve_columns(files, [2, 0], None, True, ";", None, False) == {
+        files[0]: [2, 0], files[1]: [2, 0]}
+    assert csv_schema.resolve_columns(files, None, None, True, ";", None, False) == {}
+    assert csv_schema.resolve_columns(files + ["-"], None, ["b", "a"], True, ";", None, False) == {
+        files[0]: [1, 0], files[1]: [1, 0]}
+    with pytest.raises(ValueError):
+        csv_schema.resolve_columns(files, None, ["c0"], True, ";", None, False)
+
+
+
+
+def test_resolve_columns_skips_named_pipes(tmp_path):
+    fifo = tmp_path / "table.csv"
+    os.mkfifo(fifo)
+    # The pipe is not opened, otherwise its header would be consumed
+    assert csv_schema.resolve_columns([str(fifo)], None, ["b"], True, ";", None, False) == {}
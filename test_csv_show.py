@@ -4,16 +4,23 @@ from argparse import Namespace
 from utils_for_tests import merge_args, \
     create_default_file_params, \
     create_default_column_selector, \
+    create_default_bytes_mode_argument, \
+    create_default_jobs_argument, \
     create_default_hide_header_argument, \
     convert_argparse_action_to_bool, \
-    create_file
+    create_file, \
+    run_with_options, \
+    assert_same_output
 from csv_defaults import *
 import csv_show
+import csv_cache
 
 
 def create_default_show_args() -> Namespace:
     args = merge_args(create_default_file_params(),
                       create_default_column_selector(),
+                      create_default_bytes_mode_argument(),
+                      create_default_jobs_argument(),
                       create_default_hide_header_argument())
     args.r_head = DEFAULT_SHOW_ROW_HEAD_NUMBER
     args.r_tail = DEFAULT_SHOW_ROW_TAIL_NUMBER
@@ -26,6 +33,8 @@ def create_default_show_args() -> Namespace:
     args.r_index = DEFAULT_SHOW_ROW_INDEX
     args.except_flag = convert_argparse_action_to_bool(
         DEFAULT_SHOW_EXCEPT_ACTION)
+    args.use_index = convert_argparse_action_to_bool(
+        DEFAULT_SHOW_USE_INDEX_ACTION)
     return args
 
 
@@ -1160,3 +1169,153 @@ def test_show_columns_set_as_mix_fo_index_and_name(tmp_path, capsys):
     out = capsys.readouterr().out
     assert out[:-1] == '\n'.join((exp_header, exp_r,
                                  exp_r, exp_r, exp_r, exp_r))
+
+
+def test_show_several_files_with_tail_and_except(tmp_path, capsys):
+    header = "a;b"
+    rows = tuple(f"{i};{i * 10}" for i in range(6))
+    fpath_1 = create_file(tmp_path / "test_1.csv", (header, *rows))
+    fpath_2 = create_file(tmp_path / "test_2.csv", (header,))
+
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath_1, fpath_2]
+    args.r_tail = 2
+    args.r_index = [1]
+    args.c_index = [1]
+    args.except_flag = True
+
+    csv_show.callback_show(args)
+    out = capsys.readouterr().out
+    assert out == '\n'.join((f"==> {fpath_1} <==", "a", "0", "2", "3", "",
+                             f"==> {fpath_2} <==", "a", "", ""))
+
+
+def test_show_with_sidecar_index(tmp_path, capsys):
+    header = "a;b"
+    rows = tuple(f"{i};{i * 10}" for i in range(6))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.use_index = True
+    args.from_row = [2]
+    args.to_row = [4]
+
+    csv_show.callback_show(args)
+    out = capsys.readouterr().out
+    assert out[:-1] == '\n'.join((header, rows[2], rows[3]))
+    assert (tmp_path / "test.csv.csvidx").exists()
+    # the second call uses the saved index
+    csv_show.callback_show(args)
+    out = capsys.readouterr().out
+    assert out[:-1] == '\n'.join((header, rows[2], rows[3]))
+
+
+def test_show_stops_reading_after_last_selected_row(tmp_path, capsys, monkeypatch):
+    header = "a;b"
+    rows = ("1;2", "3;4", "5;6", "7;8")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    read_rows = []
+
+    def stream_file(filename, has_header, encoding=None):
+        def content():
+            for row in rows:
+                if len(read_rows) == row_limit:
+                    raise AssertionError("The row after the last selected one is read")
+                read_rows.append(row)
+                yield row
+        return csv_show.StreamContent(header, content())
+    monkeypatch.setattr(csv_show, "stream_file", stream_file)
+    # The table is read sequentially as the standard input is
+    monkeypatch.setattr(csv_show, "is_seekable_input", lambda filename: False)
+
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.c_index = [1]
+    for selection, row_limit, expected in (({"r_head": 2}, 2, ("b", "2", "4")),
+                                           ({"r_index": [1]}, 2, ("b", "4")),
+                                           ({"from_row": [1], "to_row": [3]}, 3, ("b", "4", "6"))):
+        read_rows.clear()
+        out = run_with_options(csv_show.callback_show, args, selection, capsys).out
+        assert out[:-1] == '\n'.join(expected)
+        assert read_rows == list(rows[:row_limit])
+
+
+def test_show_bytes_mode_matches_text_mode(tmp_path, capsys):
+    header = "a;b;ç"
+    rows = tuple(f"{i};é{i};{i * 10}" for i in range(6))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    selections = ({}, {"r_head": 2}, {"r_tail": 2}, {"r_index": [1, 4]},
+                  {"from_row": [1], "to_row": [3], "c_name": ["ç"]},
+                  {"r_tail": 1, "except_flag": True, "c_index": [1]})
+    for selection in selections:
+        assert_same_output(csv_show.callback_show, args, [{"bytes_mode": True}], capsys, baseline=selection)
+
+
+def test_show_quoted_values(tmp_path, capsys):
+    header = 'name;"a;b";c'
+    rows = ('x;"1;2";3', 'y;4;"5""6"', 'z;"7";8')
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.quoted = True
+    args.c_name = ["a;b"]
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == '\n'.join(('"a;b"', '"1;2"', "4", "7")) + '\n'
+    args.c_name = None
+    args.c_tail = 1
+    args.r_tail = 2
+    csv_show.callback_show(args)
+    assert capsys.readouterr().out == '\n'.join(("c", '"5""6"', "8")) + '\n'
+
+
+def test_show_jobs_matches_single_process(tmp_path, capsys):
+    header = "a;b;c"
+    rows = tuple(f"{i};é{i};{i * 10}" for i in range(40))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    selections = ({}, {"c_index": [1]}, {"c_name": ["c"], "except_flag": True},
+                  {"c_head": 0}, {"r_head": 3})
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for selection in selections:
+        assert_same_output(csv_show.callback_show, args,
+                           [{"jobs": 3}, {"bytes_mode": True}, {"bytes_mode": True, "jobs": 3}],
+                           capsys, baseline=selection)
+
+
+def test_show_several_files_with_jobs(tmp_path, capsys):
+    files = [create_file(tmp_path / f"test_{i}.csv", ("a;b", *(f"{i};{j}" for j in range(i))))
+             for i in range(4)]
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = files
+    for selection in ({}, {"r_tail": 1, "c_index": [1]}):
+        assert_same_output(csv_show.callback_show, args, [{"jobs": 3}], capsys, baseline=selection)
+
+
+def test_show_with_cache_matches_table(tmp_path, capsys):
+    header = "a;b;c"
+    rows = tuple(f"{i};é{i % 3};{i * 10}" for i in range(10))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    selections = ({}, {"r_head": 2}, {"r_tail": 2}, {"r_index": [1, 4]},
+                  {"from_row": [1], "to_row": [3], "c_name": ["c"]},
+                  {"r_tail": 1, "except_flag": True, "c_index": [1]}, {"c_tail": 1, "hide_header": True})
+    args = create_default_show_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    expected = [assert_same_output(csv_show.callback_show, args, [{"bytes_mode": True}],
+                                   capsys, baseline=selection)
+                for selection in selections]
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    for selection, output in zip(selections, expected):
+        for bytes_mode in (False, True):
+            assert run_with_options(csv_show.callback_show, args,
+                                    dict(selection, bytes_mode=bytes_mode), capsys).out == output
@@ -1,28 +1,46 @@
 from argparse import Namespace
 import datetime
 
+import pytest
+
 from csv_read_write import FileContent
 from csv_defaults import *
 from utils_for_tests import merge_args, \
     create_default_file_params, \
     create_default_column_selector, \
     create_default_inplace_argument, \
+    create_default_columnar_argument, \
+    create_default_jobs_argument, \
     create_default_hide_header_argument, \
     convert_argparse_action_to_bool, \
-    create_file
+    create_file, \
+    run_with_options, \
+    assert_same_output
 
+import csv_cache
 import csv_sort
+import csv_time
+from csv_numpy import is_numpy_available
 
 
 def create_default_sort_args() -> Namespace:
     args = merge_args(create_default_file_params(),
                       create_default_column_selector(),
                       create_default_inplace_argument(),
+                      create_default_columnar_argument(),
+                      create_default_jobs_argument(),
                       create_default_hide_header_argument())
     args.c_type = DEFAULT_COLUMN_TYPE_LIST
     args.time_fmt = DEFAULT_TIME_FORMAT
     args.reverse = convert_argparse_action_to_bool(
         DEFAULT_SORT_REVERSE_ACTION)
+    args.limit = DEFAULT_SORT_LIMIT
+    args.numpy = convert_argparse_action_to_bool(DEFAULT_SORT_NUMPY_ACTION)
+    args.binary_keys = convert_argparse_action_to_bool(DEFAULT_SORT_BINARY_KEYS_ACTION)
+    args.cache_stats = convert_argparse_action_to_bool(
+        DEFAULT_SORT_CACHE_STATS_ACTION)
+    args.max_memory = DEFAULT_SORT_MAX_MEMORY
+    args.tmp_dir = DEFAULT_SORT_TMP_DIR
     return args
 
 
@@ -60,8 +78,8 @@ def test_comparator():
     assert len(res) == 3
     assert res[0] == "abcd"
     assert res[1] == 1.0
-    assert res[2] == datetime.datetime(year=2010, month=1, day=1, hour=13,
-                                       minute=48, second=32)
+    assert res[2] == csv_time.time_to_key(datetime.datetime(year=2010, month=1, day=1, hour=13,
+                                                            minute=48, second=32))
 
 
 def test_sort_empty_file(tmp_path):
@@ -497,3 +515,375 @@ def test_hide_header_option(tmp_path, capsys) -> None:
     csv_sort.callback_sort(args)
     out = capsys.readouterr().out
     assert out[:-1] == '\n'.join((r1, r2, r3, r4))
+
+
+def test_sort_columnar_matches_sort_content(tmp_path, capsys):
+    header = "name;value;time"
+    rows = ("b;2;2020-01-01 00:00:00", "a; 1;2019-01-01 00:00:00", "c;nan;bad",
+            "a;-0.0;2020-01-01 00:00:00", "b;0;2018-01-01 00:00:00", "c;x;2018-01-01 00:00:00")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for c_name, c_type in ((["value"], ["number"]), (["name", "value"], ["string", "number"]),
+                           (["time", "name"], ["time", "string"])):
+        for reverse in (False, True):
+            args.c_name = c_name
+            args.c_type = c_type
+            args.reverse = reverse
+            args.columnar = False
+            csv_sort.callback_sort(args)
+            expected = capsys.readouterr().out
+            args.columnar = True
+            csv_sort.callback_sort(args)
+            assert capsys.readouterr().out == expected
+
+    # Rows with different number of columns are sorted in the usual way
+    fpath = create_file(tmp_path / "test_2.csv", (header, "b;2", "a;1;x"))
+    args.files = [fpath]
+    args.c_name = ["value"]
+    args.c_type = ["number"]
+    args.reverse = False
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == '\n'.join((header, "a;1;x", "b;2")) + '\n'
+
+
+def test_sort_quoted_values(tmp_path, capsys):
+    header = 'name;"value;x"'
+    rows = ('"c;d";3', 'a;"1"', '"b""";2')
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.quoted = True
+    args.c_name = ["value;x"]
+    args.c_type = ["number"]
+    for columnar in (False, True):
+        args.columnar = columnar
+        csv_sort.callback_sort(args)
+        assert capsys.readouterr().out == '\n'.join((header, 'a;"1"', '"b""";2', '"c;d";3')) + '\n'
+    args.c_name = ["name"]
+    args.c_type = ["string"]
+    args.reverse = True
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == '\n'.join((header, '"c;d";3', '"b""";2', 'a;"1"')) + '\n'
+
+
+def test_sort_jobs_matches_single_process(tmp_path, capsys):
+    header = "name;value"
+    rows = tuple(f"{i % 5};{(i * 7) % 11}" for i in range(60))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for c_index, c_type in (([1], ["number"]), ([0, 1], ["string", "number"])):
+        for reverse in (False, True):
+            args.c_index = c_index
+            args.c_type = c_type
+            args.reverse = reverse
+            args.jobs = 1
+            csv_sort.callback_sort(args)
+            expected = capsys.readouterr().out
+            args.jobs = 4
+            csv_sort.callback_sort(args)
+            assert capsys.readouterr().out == expected
+            # The columnar table is sorted by a single process
+            args.columnar = True
+            csv_sort.callback_sort(args)
+            assert capsys.readouterr().out == expected
+            args.columnar = False
+
+
+def test_sort_several_files_with_jobs(tmp_path, capsys):
+    header = "name;value"
+    files = [create_file(tmp_path / f"test_{i}.csv",
+                         (header, *(f"{j};{(j * (i + 3)) % 7}" for j in range(10))))
+             for i in range(5)]
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = files
+    args.c_index = [1]
+    args.jobs = 1
+    csv_sort.callback_sort(args)
+    expected = capsys.readouterr().out
+    args.jobs = 3
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == expected
+
+    args.inplace = True
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == ""
+    tables = expected.split("\n\n")
+    for fpath, table in zip(files, tables):
+        assert table.startswith(f"==> {fpath} <==\n")
+        assert fpath.read_text() == table.split('\n', 1)[1].rstrip('\n')
+
+
+def test_sort_with_cache_matches_sort_content(tmp_path, capsys):
+    header = "name;value;time"
+    rows = ("b;2;2020-01-01 00:00:00", "a; 1;2019-01-01 00:00:00", "c;nan;bad",
+            "a;-0.0;2020-01-01 00:00:00", "b;0;2018-01-01 00:00:00", "c;x;2018-01-01 00:00:00")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    cases = [{"c_name": c_name, "c_type": c_type, "time_fmt": time_fmt, "reverse": reverse}
+             for c_name, c_type, time_fmt in (
+                 (["value"], ["number"], DEFAULT_TIME_FORMAT),
+                 (["name", "value"], ["string", "number"], DEFAULT_TIME_FORMAT),
+                 (["time", "name"], ["time", "string"], DEFAULT_TIME_FORMAT),
+                 (["time"], ["time"], "%Y-%m-%d %H:%M"))
+             for reverse in (False, True)]
+    expected = [run_with_options(csv_sort.callback_sort, args, case, capsys).out for case in cases]
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    assert [run_with_options(csv_sort.callback_sort, args, case, capsys).out
+            for case in cases] == expected
+
+    # The table sorted inplace does not use the outdated cache anymore
+    args.c_name, args.c_type, args.time_fmt, args.reverse = ["value"], ["number"], DEFAULT_TIME_FORMAT, False
+    args.inplace = True
+    csv_sort.callback_sort(args)
+    assert fpath.read_text() + '\n' == expected[0]
+    args.c_name = ["name"]
+    args.c_type = ["string"]
+    csv_sort.callback_sort(args)
+    args.inplace = False
+    csv_sort.callback_sort(args)
+    assert capsys.readouterr().out == fpath.read_text() + '\n'
+
+
+def test_unknown_column_is_reported_before_reading(tmp_path, capsys):
+    files = [create_file(tmp_path / "test_0.csv", ("a;b", "2;1", "1;2")),
+             create_file(tmp_path / "test_1.csv", ("a;c", "1;2"))]
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = files
+    args.c_name = ["b"]
+    args.inplace = True
+    with pytest.raises(ValueError):
+        csv_sort.callback_sort(args)
+    # The first table is not sorted since the second one has no such column
+    assert files[0].read_text() == "a;b\n2;1\n1;2"
+    assert capsys.readouterr().out == ""
+
+
+def test_sort_with_memory_limit_matches_sort_content(tmp_path, capsys):
+    header = "name;value;time"
+    rows = tuple(f"{'abc'[i % 3]};{(i * 7) % 11 if i % 5 else 'nan'};"
+                 f"20{10 + i % 4}-01-01 00:00:00" for i in range(200))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.tmp_dir = str(spill_dir)
+    for c_name, c_type in ((["value"], ["number"]), (["name", "value"], ["string", "number"]),
+                           (["time", "name"], ["time", "string"])):
+        for reverse in (False, True):
+            assert_same_output(csv_sort.callback_sort, args,
+                               [{"max_memory": max_memory} for max_memory in (1, 1000, 1 << 30)],
+                               capsys, baseline={"c_name": c_name, "c_type": c_type, "reverse": reverse})
+    assert list(spill_dir.iterdir()) == []
+
+    args.c_name = ["value"]
+    args.c_type = ["number"]
+    expected = run_with_options(csv_sort.callback_sort, args, {}, capsys).out
+    args.max_memory = 1000
+    args.inplace = True
+    csv_sort.callback_sort(args)
+    assert fpath.read_text() + '\n' == expected
+
+    args.inplace = False
+    args.columnar = True
+    with pytest.raises(ValueError):
+        csv_sort.callback_sort(args)
+
+
+def test_sort_rows_computes_keys_per_chunk():
+    rows = ("b;2", "a;1", "c;x", "a;1.0")
+    pairs, cache_info = csv_sort.sort_rows([0, 1], ["string", "number"], ";", False,
+                                           DEFAULT_TIME_FORMAT, False, rows)
+    assert cache_info == [None, csv_sort.CacheInfo(hits=0, misses=4)]
+    sorter = csv_sort.RowSorter([0, 1], ["string", "number"], ";", DEFAULT_TIME_FORMAT)
+    assert pairs == sorted(((sorter.comparator(row), row) for row in rows), key=lambda el: el[0])
+    assert [row for _, row in pairs] == ["a;1", "a;1.0", "b;2", "c;x"]
+
+
+def test_parallel_sort_keeps_stable_order(tmp_path):
+    # Many equal keys spread over all chunks show that the merge is stable
+    rows = tuple(f"{i % 3};{i}" for i in range(300))
+    fpath = create_file(tmp_path / "test.csv", rows)
+    for reverse in (False, True):
+        expected = csv_sort.sort_content(FileContent(None, rows), [0], ["number"], ";",
+                                         reverse, DEFAULT_TIME_FORMAT).content
+        for jobs, chunk_size in ((2, 1 << 20), (3, 50), (4, 7)):
+            res = csv_sort.sort_in_parallel(str(fpath), 0, jobs, [0], ["number"], ";", reverse,
+                                            DEFAULT_TIME_FORMAT, False, "utf-8", chunk_size)
+            assert tuple(res) == expected
+            res = csv_sort.sort_content_in_parallel(FileContent("h", rows), jobs, [0], ["number"],
+                                                    ";", reverse, DEFAULT_TIME_FORMAT, False,
+                                                    chunk_size)
+            assert res.header == "h"
+            assert tuple(res.content) == expected
+
+
+def test_sort_compressed_file_with_jobs(tmp_path, capsys):
+    import gzip
+    header = "name;value;time"
+    rows = tuple(f"{i % 4};{(i * 7) % 5};20{10 + i % 3}-01-01 00:00:00" for i in range(80))
+    fpath = tmp_path / "test.csv.gz"
+    fpath.write_bytes(gzip.compress('\n'.join((header, *rows)).encode()))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for c_name, c_type in ((["time", "value"], ["time", "number"]), (["name"], ["string"])):
+        for reverse in (False, True):
+            args.c_name = c_name
+            args.c_type = c_type
+            args.reverse = reverse
+            args.jobs = 1
+            csv_sort.callback_sort(args)
+            expected = capsys.readouterr().out
+            args.jobs = 3
+            csv_sort.callback_sort(args)
+            assert capsys.readouterr().out == expected
+
+
+def test_sort_top_matches_sort_content():
+    rows = tuple(f"{i % 4};{(i * 7) % 5}" for i in range(50))
+    sorter = csv_sort.RowSorter([1, 0], ["number", "string"], ";", DEFAULT_TIME_FORMAT)
+    for reverse in (False, True):
+        expected = csv_sort.sort_content(FileContent(None, rows), [1, 0], ["number", "string"],
+                                         ";", reverse, DEFAULT_TIME_FORMAT).content
+        for limit in (0, 1, 7, 50, 100):
+            for batch_size in (1, 3, 1000):
+                res = csv_sort.sort_top(rows, sorter, reverse, limit, batch_size=batch_size)
+                assert tuple(row for _, row in res) == expected[:limit]
+
+
+def test_sort_with_limit(tmp_path, capsys):
+    header = "name;value"
+    rows = tuple(f"{i % 3};{(i * 7) % 4 if i % 5 else 'x'}" for i in range(60))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for c_index, c_type in (([1], ["number"]), ([0, 1], ["string", "number"])):
+        for reverse in (False, True):
+            options = {"c_index": c_index, "c_type": c_type, "reverse": reverse}
+            lines = run_with_options(csv_sort.callback_sort, args, options, capsys).out.split('\n')
+            for limit in (0, 1, 10, 100):
+                expected = lines[:limit + 1] if limit < len(rows) else lines[:-1]
+                assert assert_same_output(csv_sort.callback_sort, args, [{"jobs": 3}], capsys,
+                                          baseline=dict(options, limit=limit)) == '\n'.join(expected) + '\n'
+    # Cached table gives the same rows
+    csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+    options["limit"] = 10
+    assert run_with_options(csv_sort.callback_sort, args, options, capsys).out == '\n'.join(lines[:11]) + '\n'
+    args.limit = -1
+    with pytest.raises(ValueError):
+        csv_sort.callback_sort(args)
+    # The table is not truncated to the first sorted rows
+    args.limit = 3
+    args.inplace = True
+    content = fpath.read_text()
+    with pytest.raises(ValueError):
+        csv_sort.callback_sort(args)
+    assert fpath.read_text() == content
+
+
+def test_row_sorter_conversion_cache():
+    rows = [f"{i % 3};2020-01-0{1 + i % 2} 00:00:00;{i}" for i in range(12)] + [";;", "x;bad;y"]
+    keys = None
+    for cache_size in (0, 1, 2, 100):
+        sorter = csv_sort.RowSorter([0, 1, 2], ["number", "time", "string"], ";",
+                                    DEFAULT_TIME_FORMAT, cache_size)
+        res = [sorter.comparator(row) for row in rows]
+        keys = res if keys is None else keys
+        assert res == keys
+        info = sorter.cache_info()
+        assert info[2] is None
+        if cache_size == 0:
+            assert info == [None, None, None]
+        else:
+            assert all(el.hits + el.misses == len(rows) for el in info[:2])
+    assert sorter.cache_info()[:2] == [csv_sort.CacheInfo(hits=9, misses=5),
+                                       csv_sort.CacheInfo(hits=10, misses=4)]
+    assert keys[-2] == (float("inf"), csv_time.MAX_TIME_KEY, "")
+    assert keys[-1] == (float("inf"), csv_time.MAX_TIME_KEY, "y")
+    # Only the empty format matches the empty value
+    sorter = csv_sort.RowSorter([0], ["time"], ";", "")
+    assert sorter.comparator("") == (csv_time.time_to_key(datetime.datetime(1900, 1, 1)),)
+
+
+def test_sort_reports_conversion_cache_stats(tmp_path, capsys):
+    header = "name;value"
+    rows = tuple(f"{i % 3};{i % 4}" for i in range(40))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.c_name = ["name", "value"]
+    args.c_type = ["string", "number"]
+    args.cache_stats = True
+    for options in ({}, {"jobs": 3}, {"limit": 5}, {"max_memory": 1}, {"limit": 5, "jobs": 3}):
+        lines = run_with_options(csv_sort.callback_sort, args, options, capsys).err.splitlines()
+        assert len(lines) == 1
+        assert lines[0].startswith(f"{fpath}: conversion cache of column 1: ")
+        hits, misses = [int(el.split()[0]) for el in lines[0].split(": ")[-1].split(", ")]
+        assert hits + misses == len(rows)
+        assert misses >= 4
+    # Statistics are reported as unavailable if values are converted without caches
+    unavailable = [{"columnar": True}, {"numpy": True}] if is_numpy_available() else [{"columnar": True}]
+    # The last run reads the table cache
+    for options in unavailable + [{}]:
+        if not options:
+            csv_cache.cache_table(str(fpath), True, ";", None, False, DEFAULT_TIME_FORMAT)
+        lines = run_with_options(csv_sort.callback_sort, args, options, capsys).err.splitlines()
+        assert len(lines) == 1
+        assert lines[0].startswith(f"{fpath}: conversion cache statistics are not available: ")
+
+
+def test_sort_with_numpy_flag(tmp_path, capsys):
+    header = "name;value"
+    rows = ("b;2", "a;nan", "c;1", "a;2", "b;x")
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    args.c_name = ["value", "name"]
+    args.c_type = ["number", "string"]
+    for reverse in (False, True):
+        args.reverse = reverse
+        args.numpy = False
+        csv_sort.callback_sort(args)
+        expected = capsys.readouterr().out
+        # The table is sorted in the usual way if NumPy is not installed
+        args.numpy = True
+        csv_sort.callback_sort(args)
+        assert capsys.readouterr().out == expected
+
+
+def test_sort_with_binary_keys(tmp_path, capsys):
+    header = "name;value;time"
+    names = ("a", "b", "", "a\x00", "é")
+    values = ("1", "-0.0", "0", "nan", "", "-2.5")
+    rows = tuple(f"{names[i % 5]};{values[i % 6]};"
+                 f"20{10 + i % 4}-01-01 00:00:0{i % 3}" for i in range(200))
+    fpath = create_file(tmp_path / "test.csv", (header, *rows))
+    args = create_default_sort_args()
+    args.delimiter = ";"
+    args.files = [fpath]
+    for c_name, c_type in ((["value"], ["number"]), (["name", "value"], ["string", "number"]),
+                           (["time", "name", "value"], ["time", "string", "number"])):
+        for reverse in (False, True):
+            baseline = {"c_name": c_name, "c_type": c_type, "reverse": reverse}
+            expected = assert_same_output(csv_sort.callback_sort, args,
+                                          [dict(options, binary_keys=True) for options in
+                                           ({}, {"quoted": True}, {"jobs": 3}, {"max_memory": 1000})],
+                                          capsys, baseline=baseline)
+            for options in ({"limit": 7}, {"limit": 7, "jobs": 3}):
+                out = run_with_options(csv_sort.callback_sort, args,
+                                       dict(baseline, binary_keys=True, **options), capsys).out
+                assert out.splitlines() == expected.splitlines()[:8]
@@ -0,0 +1,57 @@
+import datetime
+
+import csv_time
+
+
+def strptime_key(time_fmt, value):
+    try:
+        return csv_time.time_to_key(datetime.datetime.strptime(value, time_fmt))
+    except Exception:
+        # strptime fails for some formats as well, e.g. with repeated fields
+        return csv_time.MAX_TIME_KEY
+
+
+def test_time_to_key():
+    utc = datetime.timezone.utc
+    times = (datetime.datetime.min, datetime.datetime(2020, 1, 1),
+             datetime.datetime(2020, 1, 1, microsecond=1), datetime.datetime.max)
+    keys = [csv_time.time_to_key(el) for el in times]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+    assert keys[0] == 0
+    assert keys[-1] == csv_time.MAX_TIME_KEY
+    # Times with time zones are compared by UTC
+    plus_one = datetime.timezone(datetime.timedelta(hours=1))
+    assert (csv_time.time_to_key(datetime.datetime(2020, 1, 1, 1, tzinfo=plus_one))
+            == csv_time.time_to_key(datetime.datetime(2020, 1, 1, tzinfo=utc))
+            == csv_time.time_to_key(datetime.datetime(2020, 1, 1)))
+    assert csv_time.time_to_key(datetime.datetime.min.replace(tzinfo=plus_one)) < 0
+
+
+def test_compile_time_parser_matches_strptime():
+    formats = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d", "%d.%m.%Y", "%H:%M",
+               "%m/%d %H", "%Y%m%d", "%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d %H:%M:%S.%f", "%d %b %Y",
+               "%Y-%m-%d %Y", "%%%Y", "")
+    values = ("2020-01-02 03:04:05", "2020-1-2 3:4:5", "2020-01-02  03:04:05", "2020-01-02\t03:04:05",
+              "2020-02-29 00:00:00", "2019-02-29 00:00:00", "2020-02-30 00:00:00", "2020-13-01 00:00:00",
+              "2020-00-10 00:00:00", "2020-01-02 24:00:00", "2020-01-02 23:60:00",
+              "2020-01-02 23:59:60", "2020-01-02 23:59:61", "2020-01-02T03:04:05", "2020-01-02t03:04:05",
+              "2020-01-02", "02.01.2020", "2.1.2020", "12:30", "01/02 03", "20200102", "", " ",
+              "0000-01-01", "0001-01-01 00:00:00", "9999-12-31 23:59:59", "٢٠٢٠-01-02",
+              "2020-01-02 03:04:05+0100", "2020-01-02 03:04:05.123", "02 Jan 2020", "%2020",
+              " 2020-01-02 03:04:05", "2020-01-02 03:04:05 ", "garbage")
+    for time_fmt in formats:
+        parse = csv_time.compile_time_parser(time_fmt)
+        for value in values:
+            assert parse(value) == strptime_key(time_fmt, value), (time_fmt, value)
+
+
+def test_compile_fixed_format():
+    regex, fields = csv_time._compile_fixed_format("%Y-%m-%dT%H:%M:%S")
+    assert fields == list("YmdHMS")
+    assert regex.fullmatch("2020-01-02T03:04:05") is not None
+    regex, fields = csv_time._compile_fixed_format("%d.%m.%Y")
+    assert fields == ["d", "m", "Y"]
+    # Fields without separators, repeated fields, digits and other directives are left to strptime
+    for time_fmt in ("%Y%m%d", "%Y-%m-%d %Y", "%Y-%m-1", "%Y-%m-%d %H:%M:%S.%f", "%b %d", "", "-"):
+        assert csv_time._compile_fixed_format(time_fmt) is None
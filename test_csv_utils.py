@@ -8,7 +8,14 @@ from csv_utility import select_from_row, \
     build_ranges_for_singles, \
     build_ranges_for_begins_ends, \
     merge_ranges, \
-    invert_indexes
+    invert_indexes, \
+    unite_ranges, \
+    invert_ranges, \
+    select_by_ranges, \
+    split_row, \
+    split_rows, \
+    join_cells, \
+    check_quoted_delimiter
 
 
 def test_has_duplicates():
@@ -205,3 +212,60 @@ def test_invert_indexes():
     assert invert_indexes([0, 2, 3], 5) == [1, 4]
     assert invert_indexes([0], 1) == []
     assert invert_indexes([2, 3], 5) == [0, 1, 4]
+
+
+def test_unite_ranges():
+    assert unite_ranges([]) == []
+    assert unite_ranges([(1, 1)]) == []
+    assert unite_ranges([(1, 3), (2, 5), (7, 7), (8, 9)]) == [(1, 5), (8, 9)]
+    assert unite_ranges([(1, 3), (3, 5)]) == [(1, 5)]
+    assert unite_ranges([(1, 10), (2, 4), (8, 11)]) == [(1, 11)]
+
+
+def test_invert_ranges():
+    assert invert_ranges([], (0, 5)) == [(0, 5)]
+    assert invert_ranges([(0, 5)], (0, 5)) == []
+    assert invert_ranges([(1, 2), (3, 4)], (0, 5)) == [(0, 1), (2, 3), (4, 5)]
+    assert invert_ranges([(0, 2)], (0, 5)) == [(2, 5)]
+
+
+def test_select_by_ranges():
+    data = ["a", "b", "c", "d", "e"]
+    assert list(select_by_ranges(data, [])) == []
+    assert list(select_by_ranges(data, [(0, 5)])) == data
+    assert list(select_by_ranges(data, [(1, 2), (3, 10)])) == ["b", "d", "e"]
+    assert list(select_by_ranges(iter(data), [(4, 5), (7, 9)])) == ["e"]
+
+
+def test_split_row_quoted():
+    assert split_row('a;"b;c";d', ';') == ['a', '"b', 'c"', 'd']
+    assert split_row('a;"b;c";d', ';', quoted=True) == ['a', 'b;c', 'd']
+    assert split_row('"a""b";c"d;', ';', quoted=True) == ['a"b', 'c"d', '']
+    assert split_row('', ';', quoted=True) == ['']
+    with pytest.raises(ValueError):
+        split_row('"a;b', ';', quoted=True)
+    with pytest.raises(ValueError):
+        split_row('"a"b;c', ';', quoted=True)
+
+
+def test_split_rows_quoted():
+    rows = ['a;b', '', 'c;d', '"e;f";g', 'h;i']
+    assert list(split_rows(rows, ';')) == [row.split(';') for row in rows]
+    for block_size in (1, 2, 10):
+        assert list(split_rows(rows, ';', quoted=True, block_size=block_size)) == \
+            [['a', 'b'], [''], ['c', 'd'], ['e;f', 'g'], ['h', 'i']]
+    # Quoted values cannot span several rows
+    with pytest.raises(ValueError):
+        list(split_rows(['"a', 'b"'], ';', quoted=True))
+
+
+def test_join_cells_quoted():
+    cells = ['a', 'b;c', 'd"e', '']
+    assert join_cells(cells, ';') == 'a;b;c;d"e;'
+    assert join_cells(cells, ';', quoted=True) == 'a;"b;c";"d""e";'
+    assert split_row(join_cells(cells, ';', quoted=True), ';', quoted=True) == cells
+    check_quoted_delimiter(',')
+    with pytest.raises(ValueError):
+        check_quoted_delimiter(';;')
+    with pytest.raises(ValueError):
+        check_quoted_delimiter('"')
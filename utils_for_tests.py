@@ -1,7 +1,8 @@
 from argparse import Namespace
 
-from typing import Iterable
+from typing import Any, Callable, Dict, Iterable, Optional
 from pathlib import Path
+import threading
 
 from csv_defaults import *
 
@@ -15,6 +16,45 @@ def create_file(file_path: Path, content: Iterable) -> Path:
     return file_path
 
 
+
+def feed_fifo(path: Path, data: bytes) -> threading.Thread:
+    '''Writes data into the named pipe in the background thread
+    once the pipe is opened for reading'''
+    def write():
+        with open(path, 'wb') as out:
+            out.write(data)
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_with_options(callback: Callable[[Namespace], None], args: Namespace,
+                     options: Dict[str, Any], capsys) -> Any:
+    '''Calls the callback with the given options set in args and returns
+    what it printed (see capsys.readouterr). args are restored afterwards.'''
+    saved = {name: getattr(args, name) for name in options}
+    for name, value in options.items():
+        setattr(args, name, value)
+    try:
+        callback(args)
+    finally:
+        for name, value in saved.items():
+            setattr(args, name, value)
+    return capsys.readouterr()
+
+
+def assert_same_output(callback: Callable[[Namespace], None], args: Namespace,
+                       variants: Iterable[Dict[str, Any]], capsys,
+                       baseline: Optional[Dict[str, Any]] = None) -> str:
+    '''Checks that the callback prints the same output with every variant of options
+    set over the baseline ones as it does with the baseline options alone
+    and returns this output'''
+    baseline = baseline or {}
+    expected = run_with_options(callback, args, baseline, capsys).out
+    for options in variants:
+        assert run_with_options(callback, args, {**baseline, **options}, capsys).out == expected, options
+    return expected
+
 def convert_argparse_action_to_bool(action: str) -> bool:
     return not action == "store_true"
 
@@ -24,6 +64,8 @@ def create_default_file_params() -> Namespace():
     args.delimiter = DEFAULT_TABLE_DELIMITER
     args.no_header = convert_argparse_action_to_bool(
         DEFAULT_NO_HEADER_ACTION)
+    args.encoding = DEFAULT_ENCODING
+    args.quoted = convert_argparse_action_to_bool(DEFAULT_QUOTED_ACTION)
     return args
 
 
@@ -41,6 +83,26 @@ def create_default_inplace_argument() -> Namespace:
     return args
 
 
+def create_default_bytes_mode_argument() -> Namespace:
+    args = Namespace()
+    args.bytes_mode = convert_argparse_action_to_bool(
+        DEFAULT_BYTES_MODE_ACTION)
+    return args
+
+
+def create_default_columnar_argument() -> Namespace:
+    args = Namespace()
+    args.columnar = convert_argparse_action_to_bool(
+        DEFAULT_COLUMNAR_ACTION)
+    return args
+
+
+def create_default_jobs_argument() -> Namespace:
+    args = Namespace()
+    args.jobs = DEFAULT_JOBS_NUMBER
+    return args
+
+
 def create_default_hide_header_argument() -> Namespace:
     args = Namespace()
     args.hide_header = convert_argparse_action_to_bool(